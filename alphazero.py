@@ -6,15 +6,24 @@ from mcts import MCTS
 class AlphaZero(MCTS):
     """
     A modification based on pure MCTS, replacing randomly playout with using an evaluation function.
+
+    If a policy-value network is given, children are selected by PUCT with the network policy as
+    priors and leaves are valued by the network instead of evaluation_func. Leaves are then
+    evaluated in batches, using a virtual loss to spread each batch over different paths.
     """
-    def __init__(self, start_state: State, evaluation_func, c=5, n_playout=10000):
+    def __init__(self, start_state: State, evaluation_func, c=5, n_playout=10000, network=None, batch_size=8,
+                 widening_k=0, widening_alpha=0.5, max_nodes=None):
         """
         Parameters:
             evaluation_func: a function taking a state as input and
                 outputs the value in the current player's perspective.
+            network: an optional PolicyValueNet.
+            batch_size: the number of leaves evaluated by one network call.
         """
-        super().__init__(start_state, c, n_playout)
+        super().__init__(start_state, c, n_playout, widening_k, widening_alpha, max_nodes)
         self.evaluation_func = evaluation_func
+        self.network = network
+        self.batch_size = batch_size
 
     def get_leaf_value(self, state: State):
         # TODO
@@ -23,25 +32,104 @@ class AlphaZero(MCTS):
         current_player = state.get_current_player()
         end, winner = state.game_end()
         if end:
-            if winner == -1:  
+            if winner == -1:
                 return 0
             else:
                 return 1 if winner == current_player else -1
         return self.evaluation_func(state)
 
+    def search(self, state: State):
+        """Run n_playout playouts from state, which is left unmodified, or fewer if the root gets proven."""
+        if self.network is None:
+            for n in range(self.n_playout):
+                if self.root.proven is not None:
+                    break
+                self.playout(copy.deepcopy(state))
+            return
+        n = 0
+        while n < self.n_playout and self.root.proven is None:
+            batch_size = min(self.batch_size, self.n_playout - n)
+            n += self.puct_playouts([copy.deepcopy(state) for _ in range(batch_size)])
+
+    def puct_playouts(self, states):
+        """
+        Run one PUCT playout per state (all copies of the root state) and evaluate the
+        reached leaves with a single network call. Return the number of playouts backed up,
+        which is smaller than the number of states when several reach the same leaf.
+        """
+        pending = []  # (leaf node, leaf state, path) waiting for the network
+        n_backed_up = 0
+        for state in states:
+            node = self.root
+            path = [node]
+            while node.priors is not None and node.proven is None:
+                action = node.select_puct(self.c)
+                state.perform_action(action)
+                if action not in node.children:
+                    self.expand(node, action, state)
+                    self.check_terminal(node.children[action], state)
+                node = node.children[action]
+                path.append(node)
+            if node.proven is not None:
+                node.update_recursive(node.proven)
+                node.update_proven()
+                n_backed_up += 1
+                continue
+            if any(node is leaf for leaf, _, _ in pending):
+                continue  # already waiting for its evaluation in this batch
+            # virtual loss: make the path look bad to the parents until the batch is evaluated
+            for visited in path:
+                visited.n_visits += 1
+                visited.U += 1
+            pending.append((node, state, path))
+
+        if not pending:
+            return n_backed_up
+        results = self.network.predict([state for _, state, _ in pending])
+        for (node, state, path), (priors, value) in zip(pending, results):
+            for visited in path:
+                visited.n_visits -= 1
+                visited.U -= 1
+            node.priors = priors
+            node.update_recursive(value)
+        # pruning waits until the batch is evaluated, as pending leaves must stay in the tree
+        self.check_budget()
+        return n_backed_up + len(pending)
+
 
 class AlphaZeroPlayer(Player):
     """AI player based on MCTS"""
-    def __init__(self, evaluation_func, c=5, n_playout=2000):
+    def __init__(self, evaluation_func, c=5, n_playout=2000, network=None, batch_size=8,
+                 widening_k=0, widening_alpha=0.5, max_nodes=None):
         super().__init__()
         self.evaluation_func = evaluation_func
         self.c = c
         self.n_playout = n_playout
+        self.network = network
+        self.batch_size = batch_size
+        self.widening_k = widening_k
+        self.widening_alpha = widening_alpha
+        self.max_nodes = max_nodes
+        self.tree_stats = None  # the size of the tree of the last search, see MCTS.get_tree_stats
+
+    def search(self, state: State):
+        mcts = AlphaZero(state, self.evaluation_func, self.c, self.n_playout, self.network, self.batch_size,
+                         self.widening_k, self.widening_alpha, self.max_nodes)
+        mcts.search(state)
+        self.tree_stats = mcts.get_tree_stats()
+        return mcts
+
+    def get_action_visits(self, state: State):
+        """
+        Run the search from state and return a dict mapping each expanded root action
+        to its visit count, i.e. the (unnormalized) search policy used as a training target.
+        If the root got proven, the search stopped early and the visits say little, so the
+        proven move is returned alone.
+        """
+        mcts = self.search(state)
+        if mcts.root.proven is not None:
+            return {mcts.get_best_action(): 1}
+        return {action: node.n_visits for action, node in mcts.root.children.items()}
 
     def get_action(self, state: State):
-        mcts = AlphaZero(state, self.evaluation_func, self.c, self.n_playout)
-        for n in range(self.n_playout):
-            state_copy = copy.deepcopy(state)
-            mcts.playout(state_copy)
-        return max(mcts.root.children.items(),
-                   key=lambda act_node: act_node[1].n_visits)[0]
+        return self.search(state).get_best_action()
@@ -0,0 +1,94 @@
+"""
+Bulk position analysis of game records.
+
+Every position of every game in a record file is searched by an engine from play.py in a
+pool of worker processes. One JSON line is written per position:
+
+    {"game": 0, "ply": 12, "player": 1, "played_move": 31, "best_move": 40,
+     "evaluation": 0.35, "time": 0.82}
+
+where evaluation is the value of the evaluation function in the perspective of the player to
+move. Records are streamed and positions are dispatched in bounded windows, so record files of
+any size can be analyzed.
+"""
+from __future__ import print_function
+
+import json
+import time
+from itertools import islice
+from multiprocessing import Pool
+
+from evaluation import get_evaluation_func
+from play import get_player
+from record import read_records
+
+_player, _evaluation_func = None, None
+
+
+def _init_worker(args):
+    # engines are built once per worker and reused for every position
+    global _player, _evaluation_func
+    _player = get_player(args.player, args)
+    _evaluation_func = get_evaluation_func(args.analysis_evaluation_func)
+
+
+def _analyze_position(job):
+    game, ply, record = job
+    board = record.board_at(ply)
+    _player.set_player(board.get_current_player())
+    start_time = time.time()
+    best_move = _player.get_action(board)
+    elapsed = time.time() - start_time
+    return {
+        "game": game, "ply": ply, "player": board.get_current_player(),
+        "played_move": record.moves[ply],
+        "best_move": best_move, "evaluation": float(_evaluation_func(board)),
+        "time": elapsed,
+    }
+
+
+def iter_positions(path, games=None, min_ply=0):
+    """Iterate over (game index, ply, record) of every position with a move to play."""
+    for game, record in enumerate(read_records(path)):
+        if games is not None and game not in games:
+            continue
+        for ply in range(min_ply, len(record.moves)):
+            yield game, ply, record
+
+
+def analyze(args):
+    jobs = iter_positions(args.records, set(args.games) if args.games else None, args.min_ply)
+    window = args.n_workers * 16 if args.n_workers else 256
+    n = 0
+    with Pool(args.n_workers, _init_worker, (args,)) as pool, open(args.output, "w") as f:
+        while True:
+            batch = list(islice(jobs, window))
+            if not batch:
+                break
+            for result in pool.imap(_analyze_position, batch):
+                f.write(json.dumps(result) + "\n")
+                n += 1
+            f.flush()
+            print(f"{n} positions analyzed")
+    return n
+
+
+if __name__ == '__main__':
+    import argparse
+    from play import PLAYER_NAMES, add_player_arguments
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("records", type=str, help="Game record file (see record.py).")
+    parser.add_argument("--output", type=str, default="analysis.jsonl", help="Output file of the evaluations.")
+    parser.add_argument("--player", type=str, default="CuttingOffAlphaBetaSearchPlayer",
+                        choices=[name for name in PLAYER_NAMES if name != "Human"], help="Engine to analyze with.")
+    parser.add_argument("--analysis_evaluation_func", type=str, default="detailed_evaluation_func",
+                        choices=["dummy_evaluation_func", "distance_evaluation_func", "detailed_evaluation_func"],
+                        help="Evaluation function reported for every position.")
+    parser.add_argument("--games", type=int, nargs="*", default=None, help="Only analyze these games (0-based).")
+    parser.add_argument("--min_ply", type=int, default=0, help="Skip the positions before this ply.")
+    parser.add_argument("--n_workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    add_player_arguments(parser)
+    args = parser.parse_args()
+
+    analyze(args)
@@ -0,0 +1,76 @@
+"""
+Scaling benchmark from 9x9 to 19x19.
+
+The same cluster of stones is placed in the center of boards of growing size, and the time per
+call of the board and evaluation functions used by the searches is measured. With the
+active-region windowing of Board these timings should stay flat as the board grows, since they
+depend on the stones rather than on the board area.
+"""
+from __future__ import print_function
+
+import copy
+import random
+import time
+
+from game import Board
+from evaluation import detailed_evaluation_func, rank_actions
+from minimax import CuttingOffAlphaBetaSearchPlayer
+
+
+def make_position(size, n_stones, n_in_row=5, seed=0):
+    """Play n_stones random moves in the central 9x9 region of the board, avoiding wins."""
+    rng = random.Random(seed)
+    board = Board(width=size, height=size, n_in_row=n_in_row)
+    board.reset()
+    offset = (size - 9) // 2
+    while len(board._states) < n_stones:
+        # the same moves are drawn on every board size, shifted to its center
+        move = (rng.randrange(2, 7) + offset) * size + rng.randrange(2, 7) + offset
+        if move in board._states:
+            continue
+        child = copy.deepcopy(board).perform_action(move)
+        if not child.game_end()[0]:
+            board = child
+    return board
+
+
+def time_per_call(func, repeat):
+    start_time = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start_time) / repeat
+
+
+def run(sizes, n_stones, repeat, search_depth):
+    columns = ["game_end", "get_info", "evaluation", "candidates", "rank_actions"]
+    if search_depth:
+        columns.append("search")
+    print("size  " + "".join(f"{name:>14}" for name in columns) + "   (ms per call)")
+    for size in sizes:
+        board = make_position(size, n_stones)
+        timings = [
+            time_per_call(board.game_end, repeat),
+            time_per_call(board.get_info, repeat),
+            time_per_call(lambda: detailed_evaluation_func(board), repeat),
+            time_per_call(board.get_candidate_actions, repeat),
+            time_per_call(lambda: rank_actions(board), repeat),
+        ]
+        if search_depth:
+            player = CuttingOffAlphaBetaSearchPlayer(search_depth, detailed_evaluation_func, candidate_radius=1)
+            player.set_player(board.get_current_player())
+            timings.append(time_per_call(lambda: player.get_action(board), 1))
+        print(f"{size:>2}x{size:<2} " + "".join(f"{t * 1000:>14.3f}" for t in timings))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[9, 11, 13, 15, 17, 19], help="Board sizes.")
+    parser.add_argument("--n_stones", type=int, default=20, help="Number of stones on every board.")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per measurement.")
+    parser.add_argument("--search_depth", type=int, default=0,
+                        help="Also time one CuttingOffAlphaBetaSearch move of this depth (0 to skip).")
+    args = parser.parse_args()
+
+    run(args.sizes, args.n_stones, args.repeat, args.search_depth)
@@ -1,6 +1,7 @@
 """
 Evaluation functions
 """
+import json
 
 
 def dummy_evaluation_func(state):
@@ -21,41 +22,48 @@ def distance_evaluation_func(state):
     return score
 
 
-def detailed_evaluation_func(state):
+# the factors of Board.get_info weighted by detailed_evaluation_func, in the order used by tune.py
+FACTORS = ["live_four", "four", "live_three", "three", "live_two", "max_distance"]
+
+# weighted scores are divided by SCORE_SCALE and then clipped to [-1, 1]
+SCORE_SCALE = 10000
+
+WEIGHTS_PLAYER = {
+    # "live_four": 100000, # 当我有活四时，我必胜
+    # "four": 100000, # 当我有冲四时，我必胜
+    # "live_three": 4000, # 当我有活三时，马上下成活四，对方若只防守必败，对方若没有冲四，我必胜
+    # "three": 500, # 
+    # "live_two": 50,
+    # "max_distance": -100
+    "live_four": 100000, # 
+    "four": 10000, # 100000表现不错
+    "live_three": 8000, # 
+    "three": 500, # 
+    "live_two": 50, 
+    "max_distance": -100 # 50表现不错
+}
+
+WEIGHTS_OPPONENT = {
+    # "live_four": 50000, # 当对方有活四时，我靠堵必败，除非我有活四或者冲四
+    # "four": 9000, # 当对方有冲四时，可以堵，但对方有两个冲四时，我仅靠堵就很有可能输
+    # "live_three": 2000, # 当对方有活三时，可以堵，但对方有两个活三时，我只靠堵很有可能输
+    # "three": 500,
+    # "live_two": 50,
+    # "max_distance": -100
+    "live_four": 50000, 
+    "four": 8000, # 5000表现不错
+    "live_three": 4000, 
+    "three": 250, 
+    "live_two": 50,
+    "max_distance": -100
+}
+
+
+def weighted_evaluation_func(state, weights_player=WEIGHTS_PLAYER, weights_opponent=WEIGHTS_OPPONENT):
     player = state.get_current_player()
     info = state.get_info()
     score = 0.0
 
-    weights_player = {
-        # "live_four": 100000, # 当我有活四时，我必胜
-        # "four": 100000, # 当我有冲四时，我必胜
-        # "live_three": 4000, # 当我有活三时，马上下成活四，对方若只防守必败，对方若没有冲四，我必胜
-        # "three": 500, # 
-        # "live_two": 50,
-        # "max_distance": -100
-        "live_four": 100000, # 
-        "four": 10000, # 100000表现不错
-        "live_three": 8000, # 
-        "three": 500, # 
-        "live_two": 50, 
-        "max_distance": -100 # 50表现不错
-    }
-
-    weights_opponent = {
-        # "live_four": 50000, # 当对方有活四时，我靠堵必败，除非我有活四或者冲四
-        # "four": 9000, # 当对方有冲四时，可以堵，但对方有两个冲四时，我仅靠堵就很有可能输
-        # "live_three": 2000, # 当对方有活三时，可以堵，但对方有两个活三时，我只靠堵很有可能输
-        # "three": 500,
-        # "live_two": 50,
-        # "max_distance": -100
-        "live_four": 50000, 
-        "four": 8000, # 5000表现不错
-        "live_three": 4000, 
-        "three": 250, 
-        "live_two": 50,
-        "max_distance": -100
-    }
-
     for p, info_p in info.items():
         if p == player:
             for factor, weight in weights_player.items():
@@ -66,18 +74,97 @@ def detailed_evaluation_func(state):
 
     # 将评估值限制在 [-1, 1] 区间
     # max_possible_score = max(weights_player["live_four"], weights_opponent["live_four"])
-    score = score / 10000
+    score = score / SCORE_SCALE
     score = min(max(score, -1), 1) 
     
     return score
 
 
+def detailed_evaluation_func(state):
+    return weighted_evaluation_func(state)
+
+
+class WeightedEvaluationFunc(object):
+    """
+    weighted_evaluation_func with given weights, e.g. the ones fitted by tune.py.
+    Unlike a closure it can be pickled, so players using it can be sent to worker processes.
+    """
+
+    def __init__(self, weights_player, weights_opponent):
+        self.weights_player = dict(weights_player)
+        self.weights_opponent = dict(weights_opponent)
+
+    def __call__(self, state):
+        return weighted_evaluation_func(state, self.weights_player, self.weights_opponent)
+
+    @classmethod
+    def load(cls, path):
+        """Load the weights from a JSON file {"weights_player": {...}, "weights_opponent": {...}}."""
+        with open(path) as f:
+            weights = json.load(f)
+        return cls(weights["weights_player"], weights["weights_opponent"])
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"weights_player": self.weights_player, "weights_opponent": self.weights_opponent}, f, indent=4)
+
+
+def rank_actions(state, radius=2):
+    """
+    Order the available actions of a Board by a cheap move-ordering heuristic, best first.
+
+    Empty squares within radius of a stone are scored by proximity (nearby stones, closer ones
+    weighing more) and local threat (the runs of either player's stones the move would extend,
+    growing exponentially with run length, own runs slightly preferred). Squares far from all
+    stones come last, ordered by their distance to the center.
+    """
+    width, height = state._width, state._height
+    states = state._states
+    player = state.get_current_player()
+
+    near = {}
+    for move in states:
+        h, w = move // width, move % width
+        for dh in range(-radius, radius + 1):
+            for dw in range(-radius, radius + 1):
+                nh, nw = h + dh, w + dw
+                if 0 <= nh < height and 0 <= nw < width:
+                    m = nh * width + nw
+                    if m not in states:
+                        near[m] = near.get(m, 0) + 1 / max(abs(dh), abs(dw))
+
+    def center_distance(m):
+        return abs(m // width - (height - 1) / 2) + abs(m % width - (width - 1) / 2)
+
+    def score(m):
+        h, w = m // width, m % width
+        threat = 0.0
+        for dh, dw in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for p in (player, 3 - player):
+                run = 0
+                for sign in (1, -1):
+                    nh, nw = h + sign * dh, w + sign * dw
+                    while 0 <= nh < height and 0 <= nw < width and states.get(nh * width + nw) == p:
+                        run += 1
+                        nh, nw = nh + sign * dh, nw + sign * dw
+                if run:
+                    threat += 4 ** run * (1.2 if p == player else 1.0)
+        return threat + near[m]
+
+    scored = sorted(near, key=score, reverse=True)
+    rest = sorted((m for m in state.get_all_actions() if m not in near), key=center_distance)
+    return scored + rest
+
+
 def get_evaluation_func(func_name):
+    """Return an evaluation function by name, or the weighted one of a weights file (.json) written by tune.py."""
     if func_name == "dummy_evaluation_func":
         return dummy_evaluation_func
     elif func_name == "distance_evaluation_func":
         return distance_evaluation_func
     elif func_name == "detailed_evaluation_func":
         return detailed_evaluation_func
+    elif func_name.endswith(".json"):
+        return WeightedEvaluationFunc.load(func_name)
     else:
         raise KeyError(func_name)
@@ -68,6 +68,7 @@ class Board(State):
         # need how many pieces in a row to win
         self._n_in_row = int(kwargs.get('n_in_row', 5))
         self._availables, self._last_move = None, None # 可用的动作和最后一步动作
+        self._winner = -1 # 已经连成n子的玩家，-1表示还没有
 
     #  将一维的棋盘位置转换为二维坐标（行、列）
     def move_to_location(self, move):
@@ -81,10 +82,9 @@ class Board(State):
             return -1
         h = location[0]
         w = location[1]
-        move = h * self._width + w
-        if move not in range(self._width * self._height):
+        if h not in range(self._height) or w not in range(self._width):
             return -1
-        return move
+        return h * self._width + w
 
     # 重置棋盘状态
     def reset(self, start_player=0):
@@ -96,6 +96,7 @@ class Board(State):
         self._availables = list(range(self._width * self._height))
         self._states = {}
         self._last_move = -1 # 重置上一步动作为 -1。这表示没有上一步动作
+        self._winner = -1
 
     # 获取当前玩家
     def get_current_player(self):
@@ -114,40 +115,44 @@ class Board(State):
             else self._players[1]
         ) # 切换玩家
         self._last_move = action # 记录上一步动作
+        if self._winner == -1 and self.is_winning_move(action):
+            self._winner = self._states[action]
         return self
 
-    # 检查是否有玩家获胜
-    def has_a_winner(self):
+    # 检查经过 move 的四条线上是否连成了n子
+    def is_winning_move(self, move):
         width = self._width
         height = self._height
         states = self._states
-        n = self._n_in_row
-
-        moved = list(set(range(width * height)) - set(self._availables))
-        if len(moved) < self._n_in_row * 2 - 1:
-            return False, -1
-
-        for m in moved:
-            h = m // width
-            w = m % width
-            player = states[m]
-
-            if (w in range(width - n + 1) and
-                    len(set(states.get(i, -1) for i in range(m, m + n))) == 1):
-                return True, player
-
-            if (h in range(height - n + 1) and
-                    len(set(states.get(i, -1) for i in range(m, m + n * width, width))) == 1):
-                return True, player
-
-            if (w in range(width - n + 1) and h in range(height - n + 1) and
-                    len(set(states.get(i, -1) for i in range(m, m + n * (width + 1), width + 1))) == 1):
-                return True, player
-
-            if (w in range(n - 1, width) and h in range(height - n + 1) and
-                    len(set(states.get(i, -1) for i in range(m, m + n * (width - 1), width - 1))) == 1):
-                return True, player
+        player = states[move]
+        h = move // width
+        w = move % width
+        for dh, dw in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                nh, nw = h + sign * dh, w + sign * dw
+                while 0 <= nh < height and 0 <= nw < width and states.get(nh * width + nw) == player:
+                    count += 1
+                    nh, nw = nh + sign * dh, nw + sign * dw
+            if count >= self._n_in_row:
+                return True
+        return False
+
+    # 返回 player 落子后即可连成n子的空位
+    def get_winning_moves(self, player):
+        moves = []
+        for move in self.get_candidate_actions(radius=1):
+            self._states[move] = player
+            if self.is_winning_move(move):
+                moves.append(move)
+            del self._states[move]
+        return moves
 
+    # 检查是否有玩家获胜
+    # 每一步落子后只检查经过该子的四条线并记录胜者，所以这里不需要扫描整个棋盘
+    def has_a_winner(self):
+        if self._winner != -1:
+            return True, self._winner
         return False, -1
 
     # 检查游戏是否结束
@@ -160,6 +165,38 @@ class Board(State):
             return True, -1
         return False, -1
 
+    # 返回棋子外接矩形向外扩展 margin 格（不超出棋盘）的行、列范围，没有棋子时返回空范围
+    def get_window(self, margin=0):
+        if not self._states:
+            return range(0), range(0)
+        rows = [move // self._width for move in self._states]
+        cols = [move % self._width for move in self._states]
+        return (range(max(min(rows) - margin, 0), min(max(rows) + margin + 1, self._height)),
+                range(max(min(cols) - margin, 0), min(max(cols) + margin + 1, self._width)))
+
+    # 返回距离已有棋子 radius 格以内（切比雪夫距离）的空位，空棋盘时返回中心点
+    # 搜索只考虑这些位置时，每一步的分支数只与棋子数量有关，与棋盘大小无关
+    def get_candidate_actions(self, radius=2):
+        if not self._states:
+            return [(self._height // 2) * self._width + self._width // 2]
+        candidates = set()
+        for move in self._states:
+            h = move // self._width
+            w = move % self._width
+            for nh in range(max(h - radius, 0), min(h + radius + 1, self._height)):
+                for nw in range(max(w - radius, 0), min(w + radius + 1, self._width)):
+                    candidates.add(nh * self._width + nw)
+        return sorted(move for move in candidates if move not in self._states)
+
+    # 返回当前局面的二值平面表示，形状为 (2, height, width)
+    # 第0层为当前玩家的棋子，第1层为对手的棋子
+    def get_planes(self):
+        planes = np.zeros((2, self._height, self._width), dtype=np.uint8)
+        for move, player in self._states.items():
+            plane = 0 if player == self._current_player else 1
+            planes[plane, move // self._width, move % self._width] = 1
+        return planes
+
     # 方法返回一个字典，包含活四、冲四、活三、眠三、活二数量，和棋子距离棋盘中心的最大归一化距离
     # 较小的 max_distance 值可能意味着玩家的棋子分布更集中，可能更容易形成威胁
     def get_info(self):
@@ -196,12 +233,16 @@ class Board(State):
             ],
         }
 
-        state = np.zeros((self._width, self._height))
+        # 只在棋子的外接矩形（向外扩展一格）内匹配棋型：每个棋型两端距离棋子至多一格，
+        # 所以窗口外的格子不会影响匹配结果，计算量只与棋子分布范围有关，与棋盘大小无关
+        rows, cols = self.get_window(margin=1)
+        state = np.zeros((rows.stop - rows.start, cols.stop - cols.start))
         if len(self._states) > 0:
             moves, players = np.array(list(zip(*self._states.items())))
-            state[moves // self._width, moves % self._height] = players
+            state[moves // self._width - rows.start, moves % self._width - cols.start] = players
+        n_rows, n_cols = state.shape
 
-        all_state = -np.ones((4, 6, self._width, self._height))
+        all_state = -np.ones((4, 6, n_rows, n_cols))
         all_state[0, 0] = state
         all_state[1, 0] = state
         all_state[2, 0] = state
@@ -216,31 +257,31 @@ class Board(State):
 
         for player in self._players:
             info[player] = {}
-            occupied = np.zeros((4, 6, self._width, self._height), dtype=bool)
+            occupied = np.zeros((4, 6, n_rows, n_cols), dtype=bool)
             for shape_name, shape_list in info_dict.items():
                 info[player][shape_name] = 0
                 for shape in shape_list:
                     match = np.all((~occupied[:, :len(shape), :, :]) & (all_state[:, :len(shape), :, :] == player * shape[None, :, None, None]), axis=1)
                     info[player][shape_name] += match.sum()
-                    for d, w_0, h_0 in np.transpose(match.nonzero()):
+                    for d, r_0, c_0 in np.transpose(match.nonzero()):
                         for j in range(len(shape)):
                             if d == 0:
-                                w, h = w_0 + j, h_0
+                                r, c = r_0 + j, c_0
                             elif d == 1:
-                                w, h = w_0, h_0 + j
+                                r, c = r_0, c_0 + j
                             elif d == 2:
-                                w, h = w_0 + j, h_0 + j
+                                r, c = r_0 + j, c_0 + j
                             else:
-                                w, h = w_0 + j, h_0 - j
+                                r, c = r_0 + j, c_0 - j
                             for i in range(6):
-                                if d == 0 and w >= i:
-                                    occupied[0, i, w - i, h] = 1
-                                if d == 1 and h >= i:
-                                    occupied[1, i, w, h - i] = 1
-                                if d == 2 and w >= i and h >= i:
-                                    occupied[2, i, w - i, h - i] = 1
-                                if d == 3 and w >= i and h + i < self._height:
-                                    occupied[3, i, w - i, h + i] = 1
+                                if d == 0 and r >= i:
+                                    occupied[0, i, r - i, c] = 1
+                                if d == 1 and c >= i:
+                                    occupied[1, i, r, c - i] = 1
+                                if d == 2 and r >= i and c >= i:
+                                    occupied[2, i, r - i, c - i] = 1
+                                if d == 3 and r >= i and c + i < n_cols:
+                                    occupied[3, i, r - i, c + i] = 1
             max_distance = max([0.] + [abs(location // self._width - (self._height - 1) / 2)
                                        + abs(location % self._width - (self._width - 1) / 2)
                                        for location in self._states.keys() if
@@ -251,6 +292,27 @@ class Board(State):
         return info
 
 
+def get_symmetries(height, width):
+    """
+    Return the list of board symmetries as functions acting on the last two axes of an array.
+    Square boards have all 8 dihedral symmetries, non-square boards only the 4 that keep the shape.
+    """
+    symmetries = [
+        lambda x: x,
+        lambda x: np.flip(x, axis=-1),
+        lambda x: np.flip(x, axis=-2),
+        lambda x: np.rot90(x, 2, axes=(-2, -1)),
+    ]
+    if height == width:
+        symmetries += [
+            lambda x: np.rot90(x, 1, axes=(-2, -1)),
+            lambda x: np.rot90(x, 3, axes=(-2, -1)),
+            lambda x: np.swapaxes(x, -2, -1),
+            lambda x: np.rot90(np.swapaxes(x, -2, -1), 2, axes=(-2, -1)),
+        ]
+    return symmetries
+
+
 class DummyPlayer(Player):
 
     def get_action(self, state):
@@ -278,6 +340,8 @@ class Game(object):
 
     def __init__(self, board: Board, **kwargs):
         self.board = board
+        self.start_player = 0
+        self.moves = []  # moves of the last game, in the order they were played
 
     def graphic(self, board: Board, player1, player2):
         """Draw the board and show game info"""
@@ -309,6 +373,8 @@ class Game(object):
             raise Exception('start_player should be either 0 (player1 first) '
                             'or 1 (player2 first)')
         self.board.reset(start_player)
+        self.start_player = start_player
+        self.moves = []
         p1, p2 = self.board._players
         player1.set_player(p1)
         player2.set_player(p2)
@@ -318,6 +384,7 @@ class Game(object):
             
         total_times = {p1: 0, p2: 0}
         decision_times = {p1: [], p2: []}
+        max_tree_stats = {p1: None, p2: None}  # the stats of the largest search tree of tree search players
         
         while True:
             current_player = self.board.get_current_player()
@@ -329,11 +396,19 @@ class Game(object):
             decision_time = end_time - start_time 
             total_times[current_player] += decision_time 
             decision_times[current_player].append(decision_time) 
+            tree_stats = getattr(player_in_turn, "tree_stats", None)
+            if tree_stats is not None and (max_tree_stats[current_player] is None or
+                                           tree_stats["bytes"] > max_tree_stats[current_player]["bytes"]):
+                max_tree_stats[current_player] = tree_stats
             
             self.board.perform_action(move)
+            self.moves.append(move)
             if is_shown:
                 self.graphic(self.board, player1.player, player2.player)
                 print(f"Player {current_player} decision time: {decision_time:.2f} seconds")
+                if tree_stats is not None:
+                    print(f"Player {current_player} search tree: {tree_stats['nodes']} nodes, "
+                          f"{tree_stats['bytes'] / 1024:.0f} KB, {tree_stats['pruned']} pruned")
             end, winner = self.board.game_end()
             if end:
                 if is_shown:
@@ -343,6 +418,10 @@ class Game(object):
                         print("Game end. Tie")
                 print(f"Player 1 total time: {total_times[p1]:.2f} seconds")
                 print(f"Player 2 total time: {total_times[p2]:.2f} seconds")
+                for p in (p1, p2):
+                    if max_tree_stats[p] is not None:
+                        print(f"Player {p} largest search tree: {max_tree_stats[p]['nodes']} nodes, "
+                              f"{max_tree_stats[p]['bytes'] / 1024:.0f} KB")
                 
                 with open(f'time/decision_times {players[p1]} vs {players[p2]}.csv', 'w', newline='') as csvfile:
                     csv_writer = csv.writer(csvfile)
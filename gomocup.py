@@ -0,0 +1,133 @@
+"""
+Gomocup (piskvork) protocol adapter for the engine service.
+
+Reads the brain protocol from stdin and answers on stdout, asking a running server.py for
+every move, so a tournament manager can start a brain per game without paying the engine's
+start-up cost. Coordinates are "x,y" with x the column and y the row.
+
+Supported commands: START, RECTSTART, RESTART, BEGIN, TURN, BOARD, TAKEBACK, INFO, ABOUT, END.
+INFO is accepted but ignored: the engines search with a fixed budget (--n_playout, --max_depth)
+rather than a time limit, so the time budget of the manager (timeout_turn, timeout_match,
+time_left) does not reach them and the budget must be chosen to fit it.
+If the engine service fails to give a move, ERROR is sent and the brain waits for the next command.
+"""
+from __future__ import print_function
+
+import sys
+
+from server import EngineClient
+
+
+class GomocupBrain(object):
+
+    def __init__(self, client: EngineClient, player, n_in_row=5, **options):
+        self.client = client
+        self.player = player
+        self.n_in_row = n_in_row
+        self.options = options
+        self.width = self.height = None
+        self.moves = []
+        self.start_player = 0
+
+    def output(self, line):
+        print(line, flush=True)
+
+    def start(self, width, height):
+        if width < self.n_in_row or height < self.n_in_row:
+            self.output("ERROR unsupported board size")
+            return
+        self.width, self.height = width, height
+        self.moves, self.start_player = [], 0
+        self.output("OK")
+
+    def think(self):
+        try:
+            move = self.client.best_move(self.player, self.width, self.height, self.n_in_row,
+                                         self.moves, self.start_player, **self.options)
+        except (RuntimeError, OSError) as e:
+            self.output("ERROR {}".format(str(e).replace("\n", " ")))
+            return
+        self.moves.append(move)
+        self.output("{},{}".format(move % self.width, move // self.width))
+
+    def to_move(self, coords):
+        x, y = (int(v) for v in coords.split(",")[:2])
+        return y * self.width + x
+
+    def set_board(self, stones):
+        """Rebuild the move list of a BOARD command, where the brain is the player to move."""
+        own = [move for move, field in stones if field == 1]
+        opponent = [move for move, field in stones if field == 2]
+        # the order within each side does not matter, only who started
+        if len(opponent) > len(own):
+            first, second = opponent, own
+        else:
+            first, second = own, opponent
+        self.moves = [m for pair in zip(first, second) for m in pair] + first[len(second):]
+        self.start_player = 0
+
+    def run(self, stream=sys.stdin):
+        board_stones = None
+        for line in stream:
+            line = line.strip()
+            if not line:
+                continue
+            if board_stones is not None:
+                if line.upper() == "DONE":
+                    self.set_board(board_stones)
+                    board_stones = None
+                    self.think()
+                else:
+                    x, y, field = (int(v) for v in line.split(","))
+                    board_stones.append((y * self.width + x, field))
+                continue
+            cmd, _, arg = line.partition(" ")
+            cmd = cmd.upper()
+            if cmd == "START":
+                self.start(int(arg), int(arg))
+            elif cmd == "RECTSTART":
+                width, height = (int(v) for v in arg.split(","))
+                self.start(width, height)
+            elif cmd == "RESTART":
+                self.start(self.width, self.height)
+            elif cmd == "BEGIN":
+                self.think()
+            elif cmd == "TURN":
+                self.moves.append(self.to_move(arg))
+                self.think()
+            elif cmd == "BOARD":
+                board_stones = []
+            elif cmd == "TAKEBACK":
+                move = self.to_move(arg)
+                if self.moves and self.moves[-1] == move:
+                    self.moves.pop()
+                self.output("OK")
+            elif cmd == "INFO":
+                pass
+            elif cmd == "ABOUT":
+                self.output('name="Gomoku Genius", version="1.0", engine="{}"'.format(self.player))
+            elif cmd == "END":
+                break
+            else:
+                self.output("UNKNOWN {}".format(cmd))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=None, help="Unix socket of the engine service.")
+    parser.add_argument("--port", type=int, default=5555, help="Localhost TCP port of the engine service.")
+    parser.add_argument("--player", type=str, default="CuttingOffAlphaBetaSearchPlayer", help="Engine to play with.")
+    parser.add_argument("--n_in_row", type=int, default=5, help="Number of pieces in a row to win.")
+    parser.add_argument("--n_playout", type=int, default=None, help="Playout budget per move (MCTS/AlphaZero only).")
+    parser.add_argument("--max_depth", type=int, default=None, help="Search depth budget (CuttingOffAlphaBetaSearch only).")
+    args = parser.parse_args()
+
+    options = {name: value for name, value in (("n_playout", args.n_playout), ("max_depth", args.max_depth))
+               if value is not None}
+    client = EngineClient(args.socket, args.port)
+    try:
+        GomocupBrain(client, args.player, args.n_in_row, **options).run()
+    finally:
+        client.close()
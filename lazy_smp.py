@@ -0,0 +1,248 @@
+"""
+Lazy SMP: parallel cutting off alpha-beta search over a shared transposition table.
+
+Several worker processes search the same root with iterative deepening. They share nothing but a
+transposition table in a multiprocessing.shared_memory buffer, so the entries one worker stores
+(values, bounds and best moves) cut off and order the search of the others. Workers are
+diversified by starting at staggered depths and, except worker 0, by shuffling their move order.
+The first worker to complete max_depth stops the others, and the deepest completed result is played.
+
+The table is lock-free: every entry is two 64-bit words (key ^ data, data), written without
+locking. A reader only accepts an entry whose words xor to the probed key, so entries torn by
+concurrent writes are discarded as misses.
+"""
+import random
+import struct
+import weakref
+from copy import deepcopy
+from functools import lru_cache
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from game import State
+
+inf = 10000
+
+EXACT, LOWER, UPPER = 0, 1, 2
+STOP_CHECK_NODES = 64
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(n_squares):
+    """Random keys of (player 1, player 2) stones per square plus, in the last column, one key for
+    player 2 to move and one for player 2 being the root player. The seed is fixed, so every
+    process computes the same keys."""
+    rng = np.random.default_rng(20240607)
+    keys = rng.integers(1, 2 ** 63, size=(2, n_squares + 1), dtype=np.int64)
+    return [[int(k) for k in row] for row in keys]
+
+
+def position_hash(state: State, keys, root_player=1):
+    """
+    The key of state in a search for root_player. Values are stored in the root player's
+    perspective and depths count its moves, so the searches of the two players must not share entries.
+    """
+    h = keys[1][-1] if state.get_current_player() == 2 else 0
+    if root_player == 2:
+        h ^= keys[0][-1]
+    for move, player in state._states.items():
+        h ^= keys[player - 1][move]
+    return h
+
+
+def pack(value, depth, flag, move):
+    value_bits = struct.unpack("<I", struct.pack("<f", value))[0]
+    return value_bits | (depth & 0xff) << 32 | flag << 40 | (move + 1) << 42
+
+
+def unpack(data):
+    value = struct.unpack("<f", struct.pack("<I", data & 0xffffffff))[0]
+    move = (data >> 42) - 1
+    return value, (data >> 32) & 0xff, (data >> 40) & 0x3, (None if move < 0 else move)
+
+
+class SharedTranspositionTable(object):
+    """A transposition table of n_entries two-word entries plus a stop flag, in shared memory."""
+
+    def __init__(self, n_entries=1 << 20, name=None):
+        """
+        Parameters:
+            n_entries: the number of entries; ignored when attaching to an existing table.
+            name: the name of an existing table to attach to, None to create a new one.
+        """
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=16 * (n_entries + 1))
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+        self.words = np.ndarray((self.shm.size // 16, 2), dtype=np.uint64, buffer=self.shm.buf)
+        if self.owner:
+            self.words[:] = 0
+        self.n_entries = len(self.words) - 1  # the last entry holds the stop flag
+        self.name = self.shm.name
+
+    def probe(self, key):
+        """Return (value, depth, flag, move) stored for key, or None."""
+        check, data = self.words[key % self.n_entries]
+        check, data = int(check), int(data)
+        if data == 0 or check ^ data != key:
+            return None
+        return unpack(data)
+
+    def store(self, key, value, depth, flag, move):
+        data = pack(value, depth, flag, -1 if move is None else move)
+        self.words[key % self.n_entries] = (key ^ data, data)
+
+    @property
+    def stopped(self):
+        return bool(self.words[-1, 0])
+
+    @stopped.setter
+    def stopped(self, stop):
+        self.words[-1, 0] = int(stop)
+
+    def close(self):
+        del self.words
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+
+class _Stop(Exception):
+    pass
+
+
+class LazySMPWorker(object):
+    """One searcher of the pool, mirroring CuttingOffAlphaBetaSearchPlayer.get_action with a table."""
+
+    def __init__(self, player, table: SharedTranspositionTable, keys, worker_id):
+        """
+        Parameters:
+            player: a CuttingOffAlphaBetaSearchPlayer providing evaluation and get_actions.
+        """
+        self.player = player
+        self.table = table
+        self.keys = keys
+        self.worker_id = worker_id
+        self.rng = random.Random(worker_id)
+        self.n_nodes = 0
+
+    def ordered_actions(self, s: State, tt_move):
+        actions = list(self.player.get_actions(s))
+        if self.worker_id > 0:
+            self.rng.shuffle(actions)
+        if tt_move in actions:
+            actions.remove(tt_move)
+            actions.insert(0, tt_move)
+        return actions
+
+    def search(self, s: State, h, d, alpha, beta):
+        self.n_nodes += 1
+        if self.n_nodes % STOP_CHECK_NODES == 0 and self.table.stopped:
+            raise _Stop()
+        end, winner = s.game_end()
+        if end:
+            return (0 if winner == -1 else (1 if winner == self.player.player else -1)), None
+        if d == 0:
+            return self.player.evaluation(s), None
+
+        entry = self.table.probe(h)
+        tt_move = None
+        if entry is not None:
+            tt_value, tt_depth, tt_flag, tt_move = entry
+            if tt_depth >= d:
+                if tt_flag == EXACT:
+                    return tt_value, tt_move
+                if tt_flag == LOWER and tt_value >= beta:
+                    return tt_value, tt_move
+                if tt_flag == UPPER and tt_value <= alpha:
+                    return tt_value, tt_move
+
+        alpha_0, beta_0 = alpha, beta
+        player = s.get_current_player()
+        is_max = player == self.player.player
+        value, action = (-inf if is_max else inf), None
+        for a in self.ordered_actions(s, tt_move):
+            child_state = deepcopy(s)
+            child_state.perform_action(a)
+            child_h = h ^ self.keys[player - 1][a] ^ self.keys[1][-1]
+            if is_max:
+                child_value, _ = self.search(child_state, child_h, d, alpha, beta)
+                if child_value > value:
+                    value, action = child_value, a
+                if value >= beta:
+                    break
+                alpha = max(alpha, value)
+            else:
+                child_value, _ = self.search(child_state, child_h, d - 1, alpha, beta)
+                if child_value < value:
+                    value, action = child_value, a
+                if value <= alpha:
+                    break
+                beta = min(beta, value)
+
+        flag = UPPER if value <= alpha_0 else (LOWER if value >= beta_0 else EXACT)
+        self.table.store(h, value, d, flag, action)
+        return value, action
+
+    def iterative_deepening(self, state: State, start_depth, max_depth):
+        """Return (depth, value, action) of the deepest iteration completed before being stopped."""
+        result = (0, None, None)
+        h = position_hash(state, self.keys, self.player.player)
+        for depth in range(start_depth, max_depth + 1):
+            try:
+                value, action = self.search(state, h, depth, -inf, inf)
+            except _Stop:
+                break
+            result = (depth, value, action)
+        return result
+
+
+_tables = {}
+
+
+def _search_worker(job):
+    state, player, table_name, worker_id = job
+    if table_name not in _tables:
+        _tables[table_name] = SharedTranspositionTable(name=table_name)
+    table = _tables[table_name]
+    keys = zobrist_keys(state._width * state._height)
+    worker = LazySMPWorker(player, table, keys, worker_id)
+    # helpers start one depth deeper, so the pool covers two depths at once
+    start_depth = min(1 + worker_id % 2, player.max_depth)
+    return worker.iterative_deepening(state, start_depth, player.max_depth)
+
+
+class LazySMPSearch(object):
+    """The pool of workers and the shared table of one player, kept alive across moves."""
+
+    def __init__(self, n_workers, n_entries=1 << 20):
+        self.n_workers = n_workers
+        self.table = SharedTranspositionTable(n_entries)
+        self.pool = Pool(n_workers)
+        self._finalizer = weakref.finalize(self, LazySMPSearch._release, self.pool, self.table)
+
+    @staticmethod
+    def _release(pool, table):
+        pool.terminate()
+        table.close()
+
+    def close(self):
+        self._finalizer()
+
+    def search(self, state: State, player):
+        """
+        Search state with n_workers copies of player (a picklable CuttingOffAlphaBetaSearchPlayer
+        searching single-threaded) and return the action of the deepest completed search.
+        """
+        self.table.stopped = False
+        jobs = [(state, player, self.table.name, worker_id) for worker_id in range(self.n_workers)]
+        best = (0, None, None)
+        for depth, value, action in self.pool.imap_unordered(_search_worker, jobs):
+            if depth == player.max_depth:
+                self.table.stopped = True
+            if depth > best[0]:
+                best = (depth, value, action)
+        return best[2]
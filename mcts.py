@@ -1,15 +1,17 @@
 import random
+import sys
 
 import copy
 import numpy as np
 from game import State, Player
 import math
-from copy import deepcopy
+from evaluation import rank_actions
 
 
 class TreeNode(object):
     """A node in the MCTS tree. Each node keeps track of its total utility U, and its visit-count n_visit.
     """
+    __slots__ = ("parent", "actions", "children", "n_visits", "U", "priors", "proven", "amaf_visits", "amaf_U")
 
     def __init__(self, parent, state: State):
         """
@@ -18,10 +20,17 @@ class TreeNode(object):
             state (State): the state corresponding to the new node.
         """
         self.parent = parent
-        self.actions = deepcopy(state.get_all_actions())  # a list of all actions
+        # the list of actions is only built when the node is expanded (see get_unexpanded_actions),
+        # so the leaves, which are most of the tree, do not hold a copy of it
+        self.actions = None
         self.children = {}  # a map from action to TreeNode
         self.n_visits = 0 # 探索次数
         self.U = 0  # total utility 总收益
+        self.priors = None  # a map from action to prior probability, only used by PUCT selection
+        self.proven = None  # the game-theoretic value in this node's perspective (1, 0, -1) once proven
+        # all-moves-as-first statistics of the actions of this node's player, only used by RAVE
+        self.amaf_visits = None  # a map from action to the number of playouts in which it was played
+        self.amaf_U = None  # a map from action to the total utility of those playouts
 
     def expand(self, action, next_state):
         """
@@ -35,7 +44,7 @@ class TreeNode(object):
         self.children[action] = child_node
         
 
-    def get_ucb(self, c):
+    def get_ucb(self, c, rave_k=0, amaf=None):
         """Calculate and return the ucb value for this node in the parent's perspective.
         It is a combination of leaf evaluations U/N and the ``uncertainty'' from the number
         of visits of this node and its parent.
@@ -43,24 +52,66 @@ class TreeNode(object):
 
         Parameters:
             c: the trade-off hyperparameter.
+            rave_k: the RAVE equivalence parameter, the number of visits at which the
+                AMAF value and U/N are weighted about equally.
+            amaf: if given, a tuple (visits, utility) of the AMAF statistics of the action
+                leading to this node, in the parent's perspective. Its value is blended
+                with U/N with the weight beta = sqrt(rave_k / (3 * N + rave_k)).
         """
         # 节点UCB的计算
         if self.n_visits == 0:
             return float('inf')
         else:
-            # 取负号       
-            return - self.U / self.n_visits + c * math.sqrt(math.log(self.parent.n_visits) / self.n_visits)
+            # 取负号
+            value = - self.U / self.n_visits
+            if amaf is not None:
+                amaf_visits, amaf_U = amaf
+                beta = math.sqrt(rave_k / (3 * self.n_visits + rave_k))
+                value = (1 - beta) * value + beta * amaf_U / amaf_visits
+            return value + c * math.sqrt(math.log(self.parent.n_visits) / self.n_visits)
 
-    def select(self, c):
+    def select(self, c, rave_k=0):
         """Select action among children that gives maximum UCB value.
 
         Parameters:
             c: the hyperparameter in the UCB value.
+            rave_k: if positive, blend the AMAF statistics of this node into the UCB values (RAVE).
 
         Return: A tuple of (action, next_node)
         """
-        # 代码中选择节点时会**固定选取UCB最大的节点
-        return max(self.children.items(), key=lambda act_node: act_node[1].get_ucb(c))
+        def get_ucb(act_node):
+            action, node = act_node
+            if rave_k > 0 and self.amaf_visits is not None and action in self.amaf_visits:
+                return node.get_ucb(c, rave_k, (self.amaf_visits[action], self.amaf_U[action]))
+            return node.get_ucb(c)
+
+        # 代码中选择节点时会**固定选取UCB最大的节点, 已证明的子树不再探索
+        candidates = [act_node for act_node in self.children.items() if act_node[1].proven is None]
+        return max(candidates or self.children.items(), key=get_ucb)
+
+    def select_puct(self, c):
+        """Select action among all actions with a prior that gives maximum PUCT value
+        Q + c * P * sqrt(N) / (1 + n), where Q is in this node's perspective and is 0 for
+        actions that have not been visited yet.
+
+        Parameters:
+            c: the hyperparameter weighting the prior.
+
+        Return: the selected action, whose child may not be expanded yet.
+        """
+        sqrt_n = math.sqrt(self.n_visits)
+        best_action, best_value = None, float('-inf')
+        for action, prior in self.priors.items():
+            child = self.children.get(action)
+            if child is not None and child.proven is not None:
+                continue
+            if child is None or child.n_visits == 0:
+                value = c * prior * sqrt_n
+            else:
+                value = - child.U / child.n_visits + c * prior * sqrt_n / (1 + child.n_visits)
+            if value > best_value:
+                best_action, best_value = action, value
+        return best_action
 
     def update(self, leaf_value):
         """
@@ -72,6 +123,17 @@ class TreeNode(object):
         self.n_visits += 1
         self.U += leaf_value
 
+    def update_amaf(self, actions, value):
+        """
+        Update the AMAF statistics of actions, all played by this node's player in a playout
+        through this node, with the playout value in this node's perspective.
+        """
+        if self.amaf_visits is None:
+            self.amaf_visits, self.amaf_U = {}, {}
+        for action in actions:
+            self.amaf_visits[action] = self.amaf_visits.get(action, 0) + 1
+            self.amaf_U[action] = self.amaf_U.get(action, 0) + value
+
     def update_recursive(self, leaf_value):
         """Like a call to update(), but applied recursively for all ancestors.
         """
@@ -80,23 +142,187 @@ class TreeNode(object):
             self.parent.update_recursive(-leaf_value)
         self.update(leaf_value)
 
-    def get_unexpanded_actions(self):
-        return list(set(self.actions) - set(self.children.keys()))
+    def get_unexpanded_actions(self, state: State, k=None):
+        """
+        Return the unexpanded actions among the first k actions (all actions if k is None), in order.
+
+        Parameters:
+            state: the state corresponding to this node, used to list its actions on the first call.
+                Under progressive widening (k given) the actions are sorted by rank_actions, best first.
+        """
+        if self.actions is None:
+            self.actions = rank_actions(state) if k is not None else list(state.get_all_actions())
+        actions = self.actions if k is None else self.actions[:k]
+        return [action for action in actions if action not in self.children]
+
+    def is_fully_expanded(self):
+        """Whether every legal action has a child (with PUCT, every action with a prior)."""
+        actions = self.priors if self.priors is not None else self.actions
+        return actions is not None and len(self.children) == len(actions)
+
+    def update_proven(self):
+        """
+        Propagate the proven value of this node to its ancestors (MCTS-Solver): a parent is
+        proven won as soon as one child is proven lost for the player to move there, and
+        otherwise proven once all its children are, with the best of their values.
+        """
+        node = self
+        while node.parent is not None and node.proven is not None:
+            parent = node.parent
+            if parent.proven is not None:
+                break
+            if node.proven == -1:
+                parent.proven = 1
+            elif parent.is_fully_expanded() and all(child.proven is not None for child in parent.children.values()):
+                parent.proven = max(-child.proven for child in parent.children.values())
+            else:
+                break
+            node = parent
+
+    def collapse(self):
+        """
+        Drop the subtree below this node. Its statistics already include every playout through
+        the subtree, so the node simply becomes a leaf again. Return the number of nodes removed.
+        """
+        n_removed = 0
+        stack = list(self.children.values())
+        while stack:
+            node = stack.pop()
+            n_removed += 1
+            stack.extend(node.children.values())
+        self.children = {}
+        self.actions = None
+        return n_removed
+
+    def get_size(self):
+        """Estimate the memory used by this node in bytes, excluding its children."""
+        size = sys.getsizeof(self) + sys.getsizeof(self.children)
+        if self.actions is not None:
+            size += sys.getsizeof(self.actions)
+        if self.priors is not None:
+            size += sys.getsizeof(self.priors)
+        if self.amaf_visits is not None:
+            size += sys.getsizeof(self.amaf_visits) + sys.getsizeof(self.amaf_U)
+        return size
 
 
 class MCTS(object):
     """A simple implementation of Monte Carlo Tree Search."""
 
-    def __init__(self, start_state: State, c=5, n_playout=10000):
+    def __init__(self, start_state: State, c=5, n_playout=10000, widening_k=0, widening_alpha=0.5, max_nodes=None,
+                 rave_k=0):
         """
         Parameters:
             c: the hyperparameter in the UCB value.
             n_playout: the number of total playouts.
+            widening_k: if positive, enable progressive widening: a node visited n times only
+                considers its ceil(widening_k * (n + 1) ** widening_alpha) best actions by
+                rank_actions, and expands them best first instead of at random.
+            widening_alpha: the growth exponent of progressive widening.
+            max_nodes: if given, the node budget of the tree. When a playout grows the tree beyond
+                it, the least-visited subtrees are collapsed until 3/4 of the budget is used.
+            rave_k: if positive, enable RAVE: every node keeps all-moves-as-first (AMAF) statistics
+                of the moves its player makes later in the playouts through it, in the tree and in
+                the rollout, and blends them into the UCB values of its children. The AMAF weight
+                decays with the visits of a child and is 1/2 at about rave_k visits.
         """
         self.start_state = start_state
         self.root = TreeNode(None, start_state) # 创建根节点
         self.c = c
         self.n_playout = n_playout
+        self.widening_k = widening_k
+        self.widening_alpha = widening_alpha
+        self.max_nodes = max_nodes
+        self.rave_k = rave_k
+        self.n_nodes = 1
+        self.n_pruned = 0  # the number of nodes removed by all prunings
+
+    def expand(self, node: TreeNode, action, next_state: State):
+        """Expand node by the child of action, keeping count of the nodes of the tree."""
+        node.expand(action, next_state)
+        self.n_nodes += 1
+
+    def prune(self):
+        """
+        Collapse the least-visited subtrees until the tree fits in 3/4 of max_nodes.
+        A node has at most the visits of its parent, so subtrees are collapsed bottom-up.
+        """
+        internal = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child in node.children.values():
+                if child.children:
+                    internal.append(child)
+                    stack.append(child)
+        internal.sort(key=lambda node: node.n_visits)
+        target = self.max_nodes * 3 // 4
+        for node in internal:
+            if self.n_nodes <= target:
+                break
+            n_removed = node.collapse()
+            self.n_nodes -= n_removed
+            self.n_pruned += n_removed
+
+    def check_budget(self):
+        if self.max_nodes is not None and self.n_nodes > self.max_nodes:
+            self.prune()
+
+    def get_tree_stats(self):
+        """Return the number of nodes of the tree, its estimated size in bytes and the nodes pruned so far."""
+        n_bytes = 0
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            n_bytes += node.get_size()
+            stack.extend(node.children.values())
+        return {"nodes": self.n_nodes, "bytes": n_bytes, "pruned": self.n_pruned}
+
+    def check_terminal(self, node: TreeNode, state: State):
+        """Mark node as proven if state, the state of node, has ended."""
+        end, winner = state.game_end()
+        if end:
+            node.proven = 0 if winner == -1 else (1 if winner == state.get_current_player() else -1)
+
+    def get_best_action(self):
+        """Return a proven winning action if there is one, otherwise the most visited unproven
+        action, unless its value is below that of a proven draw, which is then returned instead.
+        Proven draws are no longer selected, so they are compared by value rather than visits.
+        If every action is proven to lose, the most visited one is returned."""
+        children = self.root.children.items()
+        for action, node in children:
+            if node.proven == -1:
+                return action
+        draws = [action for action, node in children if node.proven == 0]
+        unproven = [act_node for act_node in children if act_node[1].proven is None]
+        if unproven:
+            action, node = max(unproven, key=lambda act_node: act_node[1].n_visits)
+            # the value of the action in the root's perspective
+            if not draws or - node.U / max(node.n_visits, 1) >= 0:
+                return action
+        if draws:
+            return draws[0]
+        return max(children, key=lambda act_node: act_node[1].n_visits)[0]
+
+    def get_widening(self, node: TreeNode):
+        """Return the number of actions node may consider under progressive widening."""
+        return math.ceil(self.widening_k * (node.n_visits + 1) ** self.widening_alpha)
+
+    def update_amaf(self, leaf: TreeNode, leaf_value, moves):
+        """
+        Update the AMAF statistics of every node from the root to leaf with the moves
+        of a playout, in the order played from the root, and its value at the leaf.
+        """
+        path = []
+        while leaf is not None:
+            path.append(leaf)
+            leaf = leaf.parent
+        # the value in the root's perspective, negated at every level down
+        value = leaf_value if len(path) % 2 == 1 else -leaf_value
+        for depth, node in enumerate(reversed(path)):
+            # the moves of the player to move at node are every other move from there on
+            node.update_amaf(moves[depth::2], value)
+            value = -value
 
     def playout(self, state: State):
         """
@@ -104,23 +330,41 @@ class MCTS(object):
         the leaf and propagating it back through its parents.
         State is modified in-place, so a copy must be provided.
         """
+        n_moves = len(state._states)  # the moves of the playout are added after these
         node = self.root 
         while not state.game_end()[0]: # 如果游戏没有结束
-            unexpanded_actions = node.get_unexpanded_actions()
+            if self.widening_k > 0: # 第一次扩展时按启发式排序动作
+                unexpanded_actions = node.get_unexpanded_actions(state, self.get_widening(node))
+            else:
+                unexpanded_actions = node.get_unexpanded_actions(state)
+            if not unexpanded_actions and all(child.proven is not None for child in node.children.values()):
+                # 在渐进加宽的范围内的子节点都已被证明，继续加宽
+                unexpanded_actions = node.get_unexpanded_actions(state)
             if len(unexpanded_actions) > 0: # 如果还有未扩展的子节点
-                action = random.choice(unexpanded_actions) # 随机选择一个未扩展的动作
+                if self.widening_k > 0:
+                    action = unexpanded_actions[0] # 按启发式顺序扩展最好的动作
+                else:
+                    action = random.choice(unexpanded_actions) # 随机选择一个未扩展的动作
                 state.perform_action(action) # 执行动作后的子状态
-                node.expand(action, state) # 扩展节点
+                self.expand(node, action, state) # 扩展节点
                 node = node.children[action] # 将当前节点设置为扩展后的子节点
+                self.check_terminal(node, state) # 终局节点的值是已证明的
                 break
             else: # 如果所有的动作都已经扩展过了
                 # Greedily select next move.
-                action, node = node.select(self.c) # 基于 UCB 值选择下一个动作和节点，固定取UCB最大的节点
+                action, node = node.select(self.c, self.rave_k) # 基于 UCB 值选择下一个动作和节点，固定取UCB最大的节点
                 state.perform_action(action) # 执行选择的动作
 
-        leaf_value = self.get_leaf_value(state) # palyout, 评估叶子节点的值
+        if node.proven is not None:
+            leaf_value = node.proven
+        else:
+            leaf_value = self.get_leaf_value(state) # palyout, 评估叶子节点的值
         # Update value and visit count of nodes in this traversal.
         node.update_recursive(leaf_value) # 递归更新节点的值
+        if self.rave_k > 0:
+            self.update_amaf(node, leaf_value, list(state._states)[n_moves:]) # 更新路径和模拟中所有着法的AMAF统计
+        node.update_proven() # 向上传播已证明的胜负
+        self.check_budget() # 超出节点预算时剪掉访问次数最少的子树
 
     def get_leaf_value(self, state: State, limit=1000):
         """
@@ -146,15 +390,23 @@ class MCTS(object):
 
 class MCTSPlayer(Player):
     """AI player based on MCTS"""
-    def __init__(self, c=0.1, n_playout=2000):
+    def __init__(self, c=0.1, n_playout=2000, widening_k=0, widening_alpha=0.5, max_nodes=None, rave_k=0):
         super().__init__()
         self.c_puct = c
         self.n_playout = n_playout
+        self.widening_k = widening_k
+        self.widening_alpha = widening_alpha
+        self.max_nodes = max_nodes
+        self.rave_k = rave_k
+        self.tree_stats = None  # the size of the tree of the last search, see MCTS.get_tree_stats
 
     def get_action(self, state: State):
-        mcts = MCTS(state, self.c_puct, self.n_playout) # 创建MCTS实例 tree = Node(state)
+        mcts = MCTS(state, self.c_puct, self.n_playout, self.widening_k, self.widening_alpha,
+                    self.max_nodes, self.rave_k) # 创建MCTS实例 tree = Node(state)
         for n in range(self.n_playout):
+            if mcts.root.proven is not None: # 根节点已被证明，停止搜索
+                break
             state_copy = copy.deepcopy(state)
             mcts.playout(state_copy) # MCTS-sample(tree)
-        return max(mcts.root.children.items(),
-                   key=lambda act_node: act_node[1].n_visits)[0] # 返回最大访问次数的子节点action
+        self.tree_stats = mcts.get_tree_stats()
+        return mcts.get_best_action() # 返回必胜的动作或最大访问次数的子节点action
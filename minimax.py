@@ -1,6 +1,9 @@
 from typing import Tuple
 from copy import deepcopy
+from multiprocessing import current_process
 from game import State, Player
+from evaluation import dummy_evaluation_func
+from lazy_smp import LazySMPSearch
 
 inf = 10000
 
@@ -128,17 +131,30 @@ class AlphaBetaSearchPlayer(Player):
 
 class CuttingOffAlphaBetaSearchPlayer(Player):
 
-    def __init__(self, max_depth, evaluation_func=None):
+    def __init__(self, max_depth, evaluation_func=None, candidate_radius=None, n_workers=1):
         """
         Player based on cutting off alpha-beta search.
         Parameters:
             max_depth: maximum searching depth. The search will stop when the depth exists max_depth.
             evaluation_func: a function taking a state as input and
                 outputs the value in the current player's perspective.
+            candidate_radius: if given, only search the empty squares within this distance of
+                a stone (Board.get_candidate_actions) instead of all available actions.
+            n_workers: if larger than 1, search with this many processes sharing a
+                transposition table (Lazy SMP, see lazy_smp.py). The search stays serial
+                when the player is used inside a daemonic worker process.
         """
         super().__init__()
         self.max_depth = max_depth
-        self.evaluation_func = (lambda s: 0) if evaluation_func is None else evaluation_func
+        self.evaluation_func = dummy_evaluation_func if evaluation_func is None else evaluation_func
+        self.candidate_radius = candidate_radius
+        self.n_workers = n_workers
+        self.lazy_smp = None  # the worker pool, created on the first parallel search
+
+    def get_actions(self, state: State):
+        if self.candidate_radius is None:
+            return state.get_all_actions()
+        return state.get_candidate_actions(self.candidate_radius)
 
     def evaluation(self, state: State):
         """
@@ -156,6 +172,9 @@ class CuttingOffAlphaBetaSearchPlayer(Player):
         An interface for recursively searching.
         """
         assert state.get_current_player() == self.player
+        # worker processes of a pool (e.g. in analyze.py) are daemonic and can not start a pool of their own
+        if self.n_workers > 1 and not current_process().daemon:
+            return self.parallel_search(state)
 
         def cutting_off_alpha_beta_search(s: State, d, alpha, beta):
             """
@@ -184,7 +203,7 @@ class CuttingOffAlphaBetaSearchPlayer(Player):
             else:
                 if s.get_current_player() == self.player:  
                     value = -inf
-                    for a in s.get_all_actions():
+                    for a in self.get_actions(s):
                         child_state = deepcopy(s)
                         child_state.perform_action(a)
                         child_value, _ = cutting_off_alpha_beta_search(child_state, d, alpha, beta)
@@ -195,7 +214,7 @@ class CuttingOffAlphaBetaSearchPlayer(Player):
                         alpha = max(alpha, value)
                 else:  
                     value = inf
-                    for a in s.get_all_actions():
+                    for a in self.get_actions(s):
                         child_state = deepcopy(s)
                         child_state.perform_action(a)
                         child_value, _ = cutting_off_alpha_beta_search(child_state, d - 1, alpha, beta)
@@ -207,3 +226,11 @@ class CuttingOffAlphaBetaSearchPlayer(Player):
             return value, action
 
         return cutting_off_alpha_beta_search(state, self.max_depth, -inf, inf)[1]
+
+    def parallel_search(self, state: State):
+        """Search with n_workers single-threaded copies of this player sharing a transposition table."""
+        if self.lazy_smp is None:
+            self.lazy_smp = LazySMPSearch(self.n_workers)
+        searcher = CuttingOffAlphaBetaSearchPlayer(self.max_depth, self.evaluation_func, self.candidate_radius)
+        searcher.set_player(self.player)
+        return self.lazy_smp.search(state, searcher)
@@ -0,0 +1,105 @@
+"""
+A small convolutional policy-value network for AlphaZero, implemented with NumPy only.
+
+The network takes the planes of Board.get_planes (plus a constant plane marking the board area)
+and outputs a policy over all squares and a value in [-1, 1] for the player to move:
+
+    input (N, 3, H, W) -> n_layers x [3x3 conv, ReLU]
+        -> policy head: 1x1 conv to 1 channel -> logits (N, H * W)
+        -> value head:  1x1 conv to value_channels, ReLU, global average pooling, dense -> tanh (N,)
+
+All layers are fully convolutional or pooled, so the same weights work for any board size.
+Weights are stored in a .npz file with the keys
+
+    conv{i}_w (K, C, 3, 3), conv{i}_b (K,)   for i in range(n_layers)
+    policy_w (K,), policy_b ()
+    value_w (V, K), value_b (V,), value_fc_w (V,), value_fc_b ()
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def conv3x3(x, w, b):
+    """'Same' 3x3 convolution of x (N, C, H, W) with w (K, C, 3, 3), returning (N, K, H, W)."""
+    x = np.pad(x, ((0, 0), (0, 0), (1, 1), (1, 1)))
+    windows = sliding_window_view(x, (3, 3), axis=(2, 3))  # (N, C, H, W, 3, 3)
+    out = np.tensordot(windows, w, axes=([1, 4, 5], [1, 2, 3]))  # (N, H, W, K)
+    return out.transpose(0, 3, 1, 2) + b[None, :, None, None]
+
+
+class PolicyValueNet(object):
+    """CPU inference of the policy-value network."""
+
+    def __init__(self, weights):
+        """
+        Parameters:
+            weights: a dict from parameter name to array, see the module docstring.
+        """
+        self.weights = {name: np.asarray(value, dtype=np.float32) for name, value in weights.items()}
+        self.n_layers = sum(1 for name in self.weights if name.startswith("conv") and name.endswith("_w"))
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as f:
+            return cls(dict(f))
+
+    def save(self, path):
+        np.savez(path, **self.weights)
+
+    @classmethod
+    def random(cls, n_filters=32, n_layers=4, value_channels=16, seed=None):
+        """Create a network with He-initialized random weights, e.g. as the starting point of training."""
+        rng = np.random.default_rng(seed)
+        weights = {}
+        in_channels = 3
+        for i in range(n_layers):
+            weights[f"conv{i}_w"] = rng.normal(0, np.sqrt(2 / (9 * in_channels)), (n_filters, in_channels, 3, 3))
+            weights[f"conv{i}_b"] = np.zeros(n_filters)
+            in_channels = n_filters
+        weights["policy_w"] = rng.normal(0, np.sqrt(1 / n_filters), n_filters)
+        weights["policy_b"] = np.zeros(())
+        weights["value_w"] = rng.normal(0, np.sqrt(2 / n_filters), (value_channels, n_filters))
+        weights["value_b"] = np.zeros(value_channels)
+        weights["value_fc_w"] = rng.normal(0, np.sqrt(1 / value_channels), value_channels)
+        weights["value_fc_b"] = np.zeros(())
+        return cls(weights)
+
+    def forward(self, planes):
+        """
+        Run the network on a batch of positions.
+
+        Parameters:
+            planes: an array (N, 2, H, W) as returned by Board.get_planes, stacked.
+
+        Return:
+            Tuple(logits, values): policy logits (N, H * W) and values (N,).
+        """
+        planes = np.asarray(planes, dtype=np.float32)
+        ones = np.ones((planes.shape[0], 1) + planes.shape[2:], dtype=np.float32)
+        x = np.concatenate([planes, ones], axis=1)
+        for i in range(self.n_layers):
+            x = np.maximum(conv3x3(x, self.weights[f"conv{i}_w"], self.weights[f"conv{i}_b"]), 0)
+
+        w = self.weights
+        logits = np.einsum("nkhw,k->nhw", x, w["policy_w"]) + w["policy_b"]
+        v = np.maximum(np.einsum("nkhw,vk->nvhw", x, w["value_w"]) + w["value_b"][None, :, None, None], 0)
+        values = np.tanh(v.mean(axis=(2, 3)) @ w["value_fc_w"] + w["value_fc_b"])
+        return logits.reshape(len(logits), -1), values
+
+    def predict(self, states):
+        """
+        Evaluate a batch of boards.
+
+        Return:
+            A list of Tuple(priors, value) per state, where priors maps every available action
+            to its probability and value is in the perspective of the state's current player.
+        """
+        logits, values = self.forward(np.stack([s.get_planes() for s in states]))
+        results = []
+        for state, logit, value in zip(states, logits, values):
+            actions = state.get_all_actions()
+            legal = logit[actions]
+            probs = np.exp(legal - legal.max())
+            probs /= probs.sum()
+            results.append((dict(zip(actions, probs.tolist())), float(value)))
+        return results
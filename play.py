@@ -5,6 +5,33 @@ from minimax import MinimaxSearchPlayer, AlphaBetaSearchPlayer, CuttingOffAlphaB
 from mcts import MCTSPlayer
 from alphazero import AlphaZeroPlayer
 from evaluation import get_evaluation_func
+from network import PolicyValueNet
+from record import GameRecord, append_record
+from solver import ProofNumberSearchPlayer
+
+
+PLAYER_NAMES = ["Human", "DummyPlayer", "MinimaxSearchPlayer", "AlphaBetaSearchPlayer",
+                "CuttingOffAlphaBetaSearchPlayer", "MCTSPlayer", "AlphaZeroPlayer", "ProofNumberSearchPlayer"]
+
+
+def add_player_arguments(parser):
+    """Add the arguments used by get_player to an argparse parser."""
+    parser.add_argument("--max_depth", type=int, default=1, help="Maximum search depth (CuttingOffAlphaBetaSearch only).")
+    parser.add_argument("--evaluation_func", type=str, default="dummy_evaluation_func",\
+        help="Evaluation function: dummy_evaluation_func, detailed_evaluation_func or a weights file (.json) "
+             "written by tune.py (CuttingOffAlphaBetaSearch/AlphaZero only).")
+    parser.add_argument("--candidate_radius", type=int, default=None, help="Only search empty squares within this distance of a stone (CuttingOffAlphaBetaSearch only).")
+    parser.add_argument("--n_search_workers", type=int, default=1, help="Processes of the parallel Lazy SMP search, 1 for a single-threaded search (CuttingOffAlphaBetaSearch only).")
+    parser.add_argument("--max_nodes", type=int, default=100000, help="Maximum number of nodes of the proof-number search tree (ProofNumberSearch only).")
+    parser.add_argument("--solver_db", type=str, default="solved.db", help="Database of solved positions (ProofNumberSearch only).")
+    parser.add_argument("--c", type=float, default=1, help="Trade-off hyperparameter (MCTS/AlphaZero only).")
+    parser.add_argument("--n_playout", type=int, default=5000, help="Number of playouts (MCTS/AlphaZero only).")
+    parser.add_argument("--network", type=str, default=None, help="Policy-value network weights (.npz) for PUCT search (AlphaZero only).")
+    parser.add_argument("--batch_size", type=int, default=8, help="Leaves per network evaluation (AlphaZero with --network only).")
+    parser.add_argument("--widening_k", type=int, default=0, help="Initial number of actions per node under progressive widening, 0 to disable (MCTS/AlphaZero only).")
+    parser.add_argument("--widening_alpha", type=float, default=0.5, help="Growth exponent of progressive widening (MCTS/AlphaZero only).")
+    parser.add_argument("--rave_k", type=float, default=0, help="RAVE equivalence parameter, 0 to disable RAVE (MCTS only).")
+    parser.add_argument("--max_tree_nodes", type=int, default=None, help="Node budget of the search tree, unbounded if not given (MCTS/AlphaZero only).")
 
 
 def get_player(player_name, args):
@@ -17,11 +44,20 @@ def get_player(player_name, args):
     elif player_name == "AlphaBetaSearchPlayer":
         return AlphaBetaSearchPlayer()
     elif player_name == "CuttingOffAlphaBetaSearchPlayer":
-        return CuttingOffAlphaBetaSearchPlayer(args.max_depth, get_evaluation_func(args.evaluation_func))
+        return CuttingOffAlphaBetaSearchPlayer(args.max_depth, get_evaluation_func(args.evaluation_func),
+                                               args.candidate_radius, args.n_search_workers)
     elif player_name == "MCTSPlayer":
-        return MCTSPlayer(args.c, args.n_playout)
+        return MCTSPlayer(args.c, args.n_playout, args.widening_k, args.widening_alpha, args.max_tree_nodes,
+                          args.rave_k)
     elif player_name == "AlphaZeroPlayer":
-        return AlphaZeroPlayer(get_evaluation_func(args.evaluation_func), args.c, args.n_playout)
+        network = PolicyValueNet.load(args.network) if args.network else None
+        return AlphaZeroPlayer(get_evaluation_func(args.evaluation_func), args.c, args.n_playout,
+                               network, args.batch_size, args.widening_k, args.widening_alpha,
+                               args.max_tree_nodes)
+    elif player_name == "ProofNumberSearchPlayer":
+        fallback = CuttingOffAlphaBetaSearchPlayer(args.max_depth, get_evaluation_func(args.evaluation_func),
+                                                   args.candidate_radius)
+        return ProofNumberSearchPlayer(args.max_nodes, args.solver_db, fallback)
     else:
         raise KeyError(player_name)
 
@@ -36,6 +72,8 @@ def run(args):
         player_2 = get_player(args.player_2, args)
         # set start_player=0 for human first
         winner = game.start_play(player_1, player_2, start_player=0, is_shown=1)
+        if args.record:
+            append_record(args.record, GameRecord.from_game(game, winner, player_1=str(player_1), player_2=str(player_2)))
         return winner
     except KeyboardInterrupt:
         print('\n\rquit')
@@ -49,18 +87,11 @@ if __name__ == '__main__':
     parser.add_argument("--height", type=int, default=9, help="Height of board.")
     parser.add_argument("--n_in_row", type=int, default=5, help="Number of pieces in a row to win.")
     parser.add_argument("--player_1", type=str, default="DummyPlayer", \
-        choices=["Human", "DummyPlayer", "MinimaxSearchPlayer", "AlphaBetaSearchPlayer", "CuttingOffAlphaBetaSearchPlayer", "MCTSPlayer", "AlphaZeroPlayer"], \
-            help="Agent of Player 1")
+        choices=PLAYER_NAMES, help="Agent of Player 1")
     parser.add_argument("--player_2", type=str, default="DummyPlayer", \
-        choices=["Human","DummyPlayer", "MinimaxSearchPlayer", "AlphaBetaSearchPlayer", "CuttingOffAlphaBetaSearchPlayer", "MCTSPlayer", "AlphaZeroPlayer"], \
-            help="Agent of Player 2")
-    
-    parser.add_argument("--max_depth", type=int, default=1, help="Maximum search depth (CuttingOffAlphaBetaSearch only).")
-    parser.add_argument("--evaluation_func", type=str, default="dummy_evaluation_func",\
-        choices=["dummy_evaluation_func","detailed_evaluation_func"],
-        help="Evaluation function (CuttingOffAlphaBetaSearch/AlphaZero only).")
-    parser.add_argument("--c", type=float, default=1, help="Trade-off hyperparameter (MCTS/AlphaZero only).")
-    parser.add_argument("--n_playout", type=int, default=5000, help="Number of playouts (MCTS/AlphaZero only).")
+        choices=PLAYER_NAMES, help="Agent of Player 2")
+    add_player_arguments(parser)
+    parser.add_argument("--record", type=str, default=None, help="Append the record of each game to this file.")
     args = parser.parse_args()
 
     if (args.player_1 == "MCTSPlayer" and args.player_2 == "AlphaZeroPlayer") or \
@@ -0,0 +1,78 @@
+"""
+Game records.
+
+A record file holds one game per line as compact JSON, so files can be appended to while
+games are played and streamed without loading them whole:
+
+    {"width": 9, "height": 9, "n_in_row": 5, "start_player": 0, "moves": [40, 41, 31],
+     "winner": -1, "meta": {"player_1": "MCTSPlayer 1", "player_2": "AlphaZeroPlayer 2"}}
+
+Moves are board locations as used by Board.perform_action, in the order they were played.
+start_player is the argument of Board.reset (0: player 1 moves first), and winner is the
+result of Board.game_end (-1 for a tie or an unfinished game).
+"""
+import json
+
+from game import Board
+
+
+class GameRecord(object):
+    """The moves and metadata of one game."""
+
+    def __init__(self, width, height, n_in_row, moves=None, start_player=0, winner=-1, meta=None):
+        self.width = width
+        self.height = height
+        self.n_in_row = n_in_row
+        self.moves = list(moves) if moves is not None else []
+        self.start_player = start_player
+        self.winner = winner
+        self.meta = dict(meta) if meta is not None else {}
+
+    def __len__(self):
+        return len(self.moves)
+
+    @classmethod
+    def from_game(cls, game, winner=-1, **meta):
+        """Build the record of the last game played by a Game."""
+        board = game.board
+        return cls(board._width, board._height, board._n_in_row, game.moves, game.start_player, winner, meta)
+
+    @classmethod
+    def from_json(cls, line):
+        d = json.loads(line)
+        return cls(d["width"], d["height"], d["n_in_row"], d["moves"],
+                   d.get("start_player", 0), d.get("winner", -1), d.get("meta"))
+
+    def to_json(self):
+        return json.dumps({
+            "width": self.width, "height": self.height, "n_in_row": self.n_in_row,
+            "start_player": self.start_player, "moves": self.moves,
+            "winner": self.winner, "meta": self.meta,
+        }, separators=(",", ":"))
+
+    def new_board(self):
+        board = Board(width=self.width, height=self.height, n_in_row=self.n_in_row)
+        board.reset(self.start_player)
+        return board
+
+    def board_at(self, ply):
+        """Reconstruct the board after the first ply moves (ply=0 is the empty board)."""
+        if not 0 <= ply <= len(self.moves):
+            raise IndexError("ply {} out of range for a game of {} moves".format(ply, len(self.moves)))
+        board = self.new_board()
+        for move in self.moves[:ply]:
+            board.perform_action(move)
+        return board
+
+
+def read_records(path):
+    """Iterate over the records of a file, one at a time."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield GameRecord.from_json(line)
+
+
+def append_record(path, record: GameRecord):
+    with open(path, "a") as f:
+        f.write(record.to_json() + "\n")
@@ -0,0 +1,232 @@
+"""
+Self-play data generation for AlphaZero.
+
+Games are played by AlphaZeroPlayer against itself in parallel worker processes. Every position
+is recorded with the root visit distribution of the search and the final outcome of the game,
+and streamed into a directory of fixed-size chunks. Each chunk consists of three .npy files:
+
+    chunk_XXXXXX_planes.npy    uint8    (N, 2, height, width)  stones of the player to move / the opponent
+    chunk_XXXXXX_policies.npy  float16  (N, height * width)    normalized root visit counts
+    chunk_XXXXXX_values.npy    int8     (N,)                   outcome for the player to move (+1/0/-1)
+
+Chunks are memory-mapped on read, so a dataset never has to fit in RAM.
+"""
+from __future__ import print_function
+
+import glob
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from game import Board, get_symmetries
+from alphazero import AlphaZeroPlayer
+from evaluation import get_evaluation_func
+from network import PolicyValueNet
+
+
+class ChunkWriter(object):
+    """Buffer positions in memory and flush them to disk as fixed-size chunks."""
+
+    def __init__(self, directory, chunk_size=16384):
+        """
+        Parameters:
+            directory: the output directory, created if missing. Existing chunks are kept
+                and new chunks are numbered after them.
+            chunk_size: the number of positions per chunk.
+        """
+        self.directory = directory
+        self.chunk_size = chunk_size
+        os.makedirs(directory, exist_ok=True)
+        self.n_chunks = len(glob.glob(os.path.join(directory, "chunk_*_values.npy")))
+        self.n_positions = 0
+        self._planes, self._policies, self._values = [], [], []
+        self._n_buffered = 0
+
+    def add(self, planes, policies, values):
+        """Append the positions of one game, flushing every full chunk."""
+        self._planes.append(planes)
+        self._policies.append(policies)
+        self._values.append(values)
+        self._n_buffered += len(values)
+        while self._n_buffered >= self.chunk_size:
+            self._flush(self.chunk_size)
+
+    def close(self):
+        """Flush the remaining positions as a (possibly smaller) last chunk."""
+        if self._n_buffered > 0:
+            self._flush(self._n_buffered)
+
+    def _flush(self, n):
+        planes = np.concatenate(self._planes)
+        policies = np.concatenate(self._policies)
+        values = np.concatenate(self._values)
+        prefix = os.path.join(self.directory, "chunk_%06d" % self.n_chunks)
+        # values are written last, so a chunk is only visible to readers once it is complete
+        for name, array in (("planes", planes[:n]), ("policies", policies[:n]), ("values", values[:n])):
+            tmp_path = prefix + "_" + name + ".tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, prefix + "_" + name + ".npy")
+        self._planes, self._policies, self._values = [planes[n:]], [policies[n:]], [values[n:]]
+        self._n_buffered -= n
+        self.n_chunks += 1
+        self.n_positions += n
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class SelfPlayDataset(object):
+    """Read-only view over a directory of self-play chunks, memory-mapped from disk."""
+
+    def __init__(self, directory):
+        self.chunks = []
+        for values_path in sorted(glob.glob(os.path.join(directory, "chunk_*_values.npy"))):
+            prefix = values_path[:-len("_values.npy")]
+            self.chunks.append((
+                np.load(prefix + "_planes.npy", mmap_mode="r"),
+                np.load(prefix + "_policies.npy", mmap_mode="r"),
+                np.load(values_path, mmap_mode="r"),
+            ))
+        if not self.chunks:
+            raise ValueError("no self-play chunks found in {}".format(directory))
+        _, self.height, self.width = self.chunks[0][0].shape[1:]
+        self.symmetries = get_symmetries(self.height, self.width)
+        self.offsets = np.cumsum([0] + [len(values) for _, _, values in self.chunks])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _transform(self, planes, policies, symmetry):
+        # planes: (..., 2, height, width), policies: (..., height * width)
+        shape = policies.shape[:-1] + (self.height, self.width)
+        policies = symmetry(policies.reshape(shape))
+        planes = symmetry(planes)
+        return np.ascontiguousarray(planes), np.ascontiguousarray(policies.reshape(shape[:-2] + (-1,)))
+
+    def __getitem__(self, index):
+        """Return (planes, policy, value) of a single position, without augmentation."""
+        if index < 0:
+            index += len(self)
+        chunk = int(np.searchsorted(self.offsets, index, side="right")) - 1
+        planes, policies, values = self.chunks[chunk]
+        i = index - self.offsets[chunk]
+        return np.array(planes[i]), np.array(policies[i], dtype=np.float32), int(values[i])
+
+    def iter_batches(self, batch_size, shuffle=True, augment=True, rng=None):
+        """
+        Iterate over the whole dataset in batches of (planes, policies, values).
+        Only one chunk is read at a time. With augment, each batch is transformed by a
+        random board symmetry, so the same position is seen under different orientations
+        across epochs.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        order = rng.permutation(len(self.chunks)) if shuffle else range(len(self.chunks))
+        for chunk in order:
+            planes, policies, values = self.chunks[chunk]
+            indices = rng.permutation(len(values)) if shuffle else np.arange(len(values))
+            for start in range(0, len(indices), batch_size):
+                # sorted indices turn the fancy indexing into a mostly sequential read of the mmap
+                batch = np.sort(indices[start:start + batch_size])
+                batch_planes = np.asarray(planes[batch])
+                batch_policies = np.asarray(policies[batch], dtype=np.float32)
+                if augment:
+                    symmetry = self.symmetries[rng.integers(len(self.symmetries))]
+                    batch_planes, batch_policies = self._transform(batch_planes, batch_policies, symmetry)
+                yield batch_planes, batch_policies, np.asarray(values[batch], dtype=np.float32)
+
+
+def self_play_game(player: AlphaZeroPlayer, board: Board, temperature=1.0, temperature_moves=8):
+    """
+    Play one game of player against itself and return it as arrays (planes, policies, values).
+
+    Parameters:
+        temperature: the first temperature_moves moves are sampled from the visit counts
+            raised to 1 / temperature, later moves take the most visited action.
+    """
+    board.reset()
+    n_squares = board._width * board._height
+    planes, policies, players = [], [], []
+    while True:
+        visits = player.get_action_visits(board)
+        actions = list(visits.keys())
+        counts = np.array(list(visits.values()), dtype=np.float64)
+        policy = np.zeros(n_squares, dtype=np.float32)
+        policy[actions] = counts / counts.sum()
+        planes.append(board.get_planes())
+        policies.append(policy)
+        players.append(board.get_current_player())
+
+        if len(players) <= temperature_moves and temperature > 0:
+            probs = counts ** (1.0 / temperature)
+            move = random.choices(actions, weights=probs)[0]
+        else:
+            move = actions[int(np.argmax(counts))]
+        board.perform_action(move)
+        end, winner = board.game_end()
+        if end:
+            break
+
+    values = [0 if winner == -1 else (1 if p == winner else -1) for p in players]
+    return (np.stack(planes), np.stack(policies).astype(np.float16),
+            np.array(values, dtype=np.int8))
+
+
+def _self_play_worker(job):
+    seed, config = job
+    random.seed(seed)
+    network = PolicyValueNet.load(config["network"]) if config.get("network") else None
+    player = AlphaZeroPlayer(get_evaluation_func(config["evaluation_func"]), config["c"], config["n_playout"],
+                             network, config.get("batch_size", 8))
+    board = Board(width=config["width"], height=config["height"], n_in_row=config["n_in_row"])
+    return self_play_game(player, board, config["temperature"], config["temperature_moves"])
+
+
+def generate(output_dir, n_games, n_workers=None, chunk_size=16384, seed=0, **config):
+    """
+    Play n_games self-play games over a pool of n_workers processes and stream all positions
+    into output_dir. Finished games are written as they arrive, so memory use is bounded by
+    one chunk plus the games in flight.
+    """
+    jobs = ((seed + i, config) for i in range(n_games))
+    with ChunkWriter(output_dir, chunk_size) as writer, Pool(n_workers) as pool:
+        for i, game in enumerate(pool.imap_unordered(_self_play_worker, jobs)):
+            writer.add(*game)
+            print(f"game {i + 1}/{n_games}: {len(game[2])} positions")
+    return writer.n_positions
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--output_dir", type=str, default="data/selfplay", help="Directory of the chunk files.")
+    parser.add_argument("--n_games", type=int, default=100, help="Number of self-play games.")
+    parser.add_argument("--n_workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    parser.add_argument("--chunk_size", type=int, default=16384, help="Number of positions per chunk.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the first game.")
+    parser.add_argument("--width", type=int, default=9, help="Width of board.")
+    parser.add_argument("--height", type=int, default=9, help="Height of board.")
+    parser.add_argument("--n_in_row", type=int, default=5, help="Number of pieces in a row to win.")
+    parser.add_argument("--evaluation_func", type=str, default="detailed_evaluation_func",
+                        choices=["dummy_evaluation_func", "distance_evaluation_func", "detailed_evaluation_func"],
+                        help="Evaluation function of the search.")
+    parser.add_argument("--c", type=float, default=5, help="Trade-off hyperparameter.")
+    parser.add_argument("--n_playout", type=int, default=400, help="Number of playouts per move.")
+    parser.add_argument("--network", type=str, default=None, help="Policy-value network weights (.npz) for PUCT search.")
+    parser.add_argument("--batch_size", type=int, default=8, help="Leaves per network evaluation.")
+    parser.add_argument("--temperature", type=float, default=1.0, help="Sampling temperature of the opening moves.")
+    parser.add_argument("--temperature_moves", type=int, default=8, help="Number of moves sampled with temperature.")
+    args = parser.parse_args()
+
+    n_positions = generate(args.output_dir, args.n_games, args.n_workers, args.chunk_size, args.seed,
+                           width=args.width, height=args.height, n_in_row=args.n_in_row,
+                           evaluation_func=args.evaluation_func, c=args.c, n_playout=args.n_playout,
+                           network=args.network, batch_size=args.batch_size,
+                           temperature=args.temperature, temperature_moves=args.temperature_moves)
+    print(f"{n_positions} positions written to {args.output_dir}")
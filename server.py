@@ -0,0 +1,271 @@
+"""
+A long-running engine service.
+
+The service keeps a pool of worker processes with warm players from play.py's get_player and
+answers requests over a Unix socket or a localhost TCP port. The protocol is one JSON object
+per line in each direction:
+
+    -> {"id": 1, "cmd": "best_move", "player": "MCTSPlayer", "width": 9, "height": 9,
+        "n_in_row": 5, "start_player": 0, "moves": [40, 41], "options": {"n_playout": 2000}}
+    <- {"id": 1, "move": 31, "time": 1.92}
+
+    -> {"id": 1, "cmd": "cancel"}
+    <- {"id": 1, "cancelled": true}
+
+    -> {"id": 2, "cmd": "ping"}
+    <- {"id": 2, "pong": true}
+
+options override the play.py arguments of the player (the search budget such as n_playout or
+max_depth, the evaluation function, ...). Each worker keeps up to MAX_WARM_PLAYERS players, one
+per player name and options other than the budget, which is set on the player for every request.
+Errors are answered as {"id": ..., "error": "..."}.
+Requests from all connections share one queue served by the worker pool. A queued request
+is dropped when cancelled; a request that is already searching can not be interrupted, its
+worker finishes the search and the result is discarded.
+"""
+from __future__ import print_function
+
+import argparse
+import asyncio
+import json
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from record import GameRecord
+
+# options read by the players at every move, set on the cached player instead of being part of its key
+BUDGET_OPTIONS = ("n_playout", "max_depth")
+MAX_WARM_PLAYERS = 8  # players cached per worker
+
+_default_args, _players = None, OrderedDict()
+
+
+def _release_player(player):
+    # the pool and shared table of a parallel alpha-beta search live as long as the player
+    for p in (player, getattr(player, "fallback", None)):
+        if getattr(p, "lazy_smp", None) is not None:
+            p.lazy_smp.close()
+
+
+def _get_warm_player(name, options):
+    # players are cached per worker by their construction arguments, so repeated requests skip
+    # construction; the least recently used player is released when the cache is full
+    key = (name, tuple(sorted((k, v) for k, v in options.items() if k not in BUDGET_OPTIONS)))
+    if key in _players:
+        _players.move_to_end(key)
+    else:
+        from play import get_player
+        _players[key] = get_player(name, argparse.Namespace(**{**vars(_default_args), **options}))
+        if len(_players) > MAX_WARM_PLAYERS:
+            _release_player(_players.popitem(last=False)[1])
+    player = _players[key]
+    for option in BUDGET_OPTIONS:
+        for p in (player, getattr(player, "fallback", None)):
+            if hasattr(p, option):
+                setattr(p, option, options.get(option, getattr(_default_args, option)))
+    return player
+
+
+def _init_worker(default_args, warm_players):
+    global _default_args
+    _default_args = default_args
+    for name in warm_players:
+        _get_warm_player(name, {})
+
+
+def _best_move(request):
+    if request["player"] == "Human":
+        raise ValueError("Human can not be served")
+    record = GameRecord(request["width"], request["height"], request.get("n_in_row", 5),
+                        request.get("moves", []), request.get("start_player", 0))
+    board = record.board_at(len(record))
+    if board.game_end()[0]:
+        raise ValueError("the game has already ended")
+    player = _get_warm_player(request["player"], request.get("options", {}))
+    player.set_player(board.get_current_player())
+    start_time = time.time()
+    move = player.get_action(board)
+    return {"move": int(move), "time": time.time() - start_time}
+
+
+class _Job(object):
+
+    def __init__(self, request):
+        self.request = request
+        self.future = asyncio.get_running_loop().create_future()
+        self.cancelled = False
+
+
+class EngineService(object):
+    """Queue best-move requests from many clients over a pool of warm worker processes."""
+
+    def __init__(self, n_workers, default_args, warm_players=()):
+        """
+        Parameters:
+            n_workers: the number of worker processes, i.e. of concurrent searches.
+            default_args: the play.py arguments used for options a request does not set.
+            warm_players: names of players to build in every worker at start-up.
+        """
+        self.n_workers = n_workers
+        self.executor = ProcessPoolExecutor(n_workers, initializer=_init_worker,
+                                            initargs=(default_args, list(warm_players)))
+        self.queue = None
+        self.dispatchers = []
+
+    async def start(self):
+        self.queue = asyncio.Queue()
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.n_workers)]
+
+    def close(self):
+        for task in self.dispatchers:
+            task.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def _dispatch(self):
+        # one dispatcher per worker: a job is handed to the pool only when a worker is free,
+        # so cancelled jobs never reach a worker
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            if job.cancelled:
+                continue
+            try:
+                result = await loop.run_in_executor(self.executor, _best_move, job.request)
+            except Exception as e:
+                result = {"error": "{}: {}".format(e.__class__.__name__, e)}
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def handle_client(self, reader, writer):
+        jobs = {}  # request id -> _Job of this connection
+        tasks = set()
+
+        async def send(response):
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        async def reply(request_id, job):
+            result = await job.future
+            jobs.pop(request_id, None)
+            if not job.cancelled:
+                await send({"id": request_id, **result})
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    request_id = request.get("id")
+                    cmd = request.get("cmd", "best_move")
+                except (ValueError, AttributeError):
+                    await send({"id": None, "error": "invalid request"})
+                    continue
+                if cmd == "ping":
+                    await send({"id": request_id, "pong": True})
+                elif cmd == "cancel":
+                    job = jobs.pop(request_id, None)
+                    if job is not None:
+                        job.cancelled = True
+                        if not job.future.done():
+                            job.future.set_result({})
+                    await send({"id": request_id, "cancelled": job is not None})
+                elif cmd == "best_move":
+                    if request_id in jobs:
+                        await send({"id": request_id, "error": "duplicate request id"})
+                        continue
+                    job = jobs[request_id] = _Job(request)
+                    await self.queue.put(job)
+                    task = asyncio.create_task(reply(request_id, job))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    await send({"id": request_id, "error": "unknown command {}".format(cmd)})
+        except ConnectionError:
+            pass
+        finally:
+            # a closed connection cancels everything it still waits for
+            for job in jobs.values():
+                job.cancelled = True
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+
+class EngineClient(object):
+    """A blocking client of the engine service."""
+
+    def __init__(self, unix_socket=None, port=None):
+        if unix_socket is not None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(unix_socket)
+        else:
+            self.sock = socket.create_connection(("127.0.0.1", port))
+        self.file = self.sock.makefile("rw")
+        self.next_id = 0
+
+    def request(self, **request):
+        """Send a request and wait for its response."""
+        self.next_id += 1
+        request["id"] = self.next_id
+        self.file.write(json.dumps(request) + "\n")
+        self.file.flush()
+        while True:
+            line = self.file.readline()
+            if not line:
+                raise ConnectionError("engine service closed the connection")
+            response = json.loads(line)
+            if response.get("id") == request["id"]:
+                return response
+
+    def best_move(self, player, width, height, n_in_row, moves, start_player=0, **options):
+        response = self.request(cmd="best_move", player=player, width=width, height=height, n_in_row=n_in_row,
+                                moves=list(moves), start_player=start_player, options=options)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["move"]
+
+    def close(self):
+        try:
+            self.file.close()
+        except OSError:
+            pass  # the service is gone, the unsent data is of no use
+        self.sock.close()
+
+
+async def serve(args):
+    service = EngineService(args.n_workers, args, args.warm)
+    await service.start()
+    if args.socket:
+        server = await asyncio.start_unix_server(service.handle_client, path=args.socket)
+    else:
+        server = await asyncio.start_server(service.handle_client, host="127.0.0.1", port=args.port)
+    print("Engine service listening on", args.socket or "127.0.0.1:{}".format(args.port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    import os
+    from play import PLAYER_NAMES, add_player_arguments
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", type=str, default=None, help="Listen on this Unix socket instead of a TCP port.")
+    parser.add_argument("--port", type=int, default=5555, help="Localhost TCP port to listen on.")
+    parser.add_argument("--n_workers", type=int, default=os.cpu_count(), help="Number of worker processes.")
+    parser.add_argument("--warm", type=str, nargs="*", default=[],
+                        choices=[name for name in PLAYER_NAMES if name != "Human"],
+                        help="Players to build in every worker at start-up.")
+    add_player_arguments(parser)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print('\n\rquit')
@@ -0,0 +1,253 @@
+"""
+Proof-number search solver with a persistent database of solved positions.
+
+ProofNumberSearchPlayer decides "the player to move scores at least t" with proof-number search,
+first for t=1 (a forced win) and, if that is disproved, for t=0 (at least a draw), so a solved
+position is a win (1), a draw (0) or a loss (-1) for the player to move.
+
+Every node that gets proved or disproved adds a bound on its value to a SQLite database, keyed by
+a digest of the position that is invariant under board symmetries. Later searches look every new
+node up, so a solved position costs a lookup instead of a search, and partially solved ones
+(e.g. "not a win") keep their bound. Memory is bounded by max_nodes: the subtree of a solved node
+is discarded and the search gives up when the tree grows beyond max_nodes.
+"""
+import copy
+import hashlib
+import sqlite3
+
+import numpy as np
+
+from game import State, Player, get_symmetries
+
+INF = 10 ** 9
+
+
+def position_key(planes, n_in_row):
+    """
+    A 16-byte digest of the position given by Board.get_planes, the same for all symmetric positions.
+    """
+    height, width = planes.shape[1:]
+    data = min(np.ascontiguousarray(symmetry(planes)).tobytes() for symmetry in get_symmetries(height, width))
+    header = "{}x{}/{}:".format(width, height, n_in_row).encode()
+    return hashlib.blake2b(header + data, digest_size=16).digest()
+
+
+class SolvedDatabase(object):
+    """Bounds (lower, upper) on the value of positions for the player to move, stored in SQLite."""
+
+    def __init__(self, path=":memory:", max_pending=10000):
+        """
+        Parameters:
+            max_pending: the number of bounds kept in memory before they are written to the database.
+        """
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS solved "
+                                "(key BLOB PRIMARY KEY, lower INTEGER NOT NULL, upper INTEGER NOT NULL)")
+        self.pending = {}  # bounds found since the last commit
+        self.max_pending = max_pending
+
+    def get(self, key):
+        """Return the bounds (lower, upper) of a position, (-1, 1) if nothing is known."""
+        if key in self.pending:
+            return self.pending[key]
+        row = self.connection.execute("SELECT lower, upper FROM solved WHERE key = ?", (key,)).fetchone()
+        return tuple(row) if row is not None else (-1, 1)
+
+    def update(self, key, lower=-1, upper=1):
+        """Tighten the bounds of a position."""
+        old_lower, old_upper = self.get(key)
+        self.pending[key] = (max(lower, old_lower), min(upper, old_upper))
+        if len(self.pending) >= self.max_pending:
+            # searches can run for long with a bounded tree, so the found bounds must not pile up
+            self.commit()
+
+    def commit(self):
+        self.connection.executemany(
+            "INSERT INTO solved VALUES (?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+            "lower = max(lower, excluded.lower), upper = min(upper, excluded.upper)",
+            [(key, lower, upper) for key, (lower, upper) in self.pending.items()])
+        self.connection.commit()
+        self.pending = {}
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM solved").fetchone()[0] + len(self.pending)
+
+
+class PNSNode(object):
+    """A node of the proof-number search tree. Its state is rebuilt from the moves on the path."""
+    __slots__ = ("move", "parent", "children", "pn", "dn", "is_or", "key")
+
+    def __init__(self, move, parent, is_or, key):
+        self.move = move
+        self.parent = parent
+        self.children = None
+        self.pn, self.dn = 1, 1
+        self.is_or = is_or  # whether the root player is to move
+        self.key = key
+
+    def is_solved(self):
+        return self.pn == 0 or self.dn == 0
+
+    def set_numbers(self):
+        if self.is_or:
+            self.pn = min(child.pn for child in self.children)
+            self.dn = min(sum(child.dn for child in self.children), INF)
+        else:
+            self.pn = min(sum(child.pn for child in self.children), INF)
+            self.dn = min(child.dn for child in self.children)
+
+
+class ProofNumberSearch(object):
+    """Proof-number search for "the root player scores at least threshold"."""
+
+    def __init__(self, database: SolvedDatabase, max_nodes=100000):
+        self.database = database
+        self.max_nodes = max_nodes
+        self.n_nodes = 0
+
+    def prove(self, state: State, threshold):
+        """
+        Return Tuple(result, root): result is True if proved, False if disproved and None if
+        the node budget ran out, root is the search tree.
+        """
+        self.threshold = threshold
+        self.root_player = state.get_current_player()
+        root = PNSNode(None, None, True, position_key(state.get_planes(), state._n_in_row))
+        self.set_bounds(root, *self.database.get(root.key))
+        self.n_nodes = 1
+        while not root.is_solved() and self.n_nodes < self.max_nodes:
+            node, node_state = root, copy.deepcopy(state)
+            while node.children:
+                # the most-proving node: follow the child that is cheapest to prove at OR nodes,
+                # cheapest to disprove at AND nodes
+                node = min(node.children, key=(lambda c: c.pn) if node.is_or else (lambda c: c.dn))
+                node_state.perform_action(node.move)
+            self.expand(node, node_state)
+            self.backup(node)
+        self.database.commit()
+        if root.pn == 0:
+            return True, root
+        if root.dn == 0:
+            return False, root
+        return None, root
+
+    def set_bounds(self, node: PNSNode, lower, upper, mover_is_root=None):
+        """Set the proof numbers of node from bounds on its value for its player to move."""
+        if mover_is_root is None:
+            mover_is_root = node.is_or
+        if not mover_is_root:
+            lower, upper = -upper, -lower
+        if lower >= self.threshold:
+            node.pn, node.dn = 0, INF
+        elif upper < self.threshold:
+            node.pn, node.dn = INF, 0
+
+    def expand(self, node: PNSNode, state: State):
+        end, winner = state.game_end()
+        if end:
+            value = 0 if winner == -1 else (1 if winner == self.root_player else -1)
+            self.set_bounds(node, value, value, mover_is_root=True)
+            return
+        player = state.get_current_player()
+        opponent = 3 - player
+        winning_moves = state.get_winning_moves(player)
+        if winning_moves:
+            # the player to move wins at once, no need to look at other moves
+            value = 1 if player == self.root_player else -1
+            self.set_bounds(node, value, value, mover_is_root=True)
+            return
+        # if the opponent threatens to win, every move but a block loses at once
+        moves = state.get_winning_moves(opponent) or list(state.get_all_actions())
+        node.children = []
+        planes = state.get_planes()
+        width = state._width
+        for move in moves:
+            # the child seen by the opponent: the planes swap and the move joins the second one
+            child_planes = planes[::-1].copy()
+            child_planes[1, move // width, move % width] = 1
+            child = PNSNode(move, node, not node.is_or, position_key(child_planes, state._n_in_row))
+            if len(state.get_all_actions()) == 1:
+                self.set_bounds(child, 0, 0)
+            else:
+                self.set_bounds(child, *self.database.get(child.key))
+            node.children.append(child)
+        self.n_nodes += len(node.children)
+
+    def backup(self, node: PNSNode):
+        while node is not None:
+            if node.children:
+                node.set_numbers()
+            if node.is_solved():
+                self.record(node)
+                if node.parent is not None and node.children:
+                    self.n_nodes -= self.count(node) - 1
+                    node.children = None
+            node = node.parent
+
+    def record(self, node: PNSNode):
+        # proved: the root player scores >= threshold, disproved: <= threshold - 1
+        if node.pn == 0:
+            lower, upper = self.threshold, 1
+        else:
+            lower, upper = -1, self.threshold - 1
+        if not node.is_or:
+            lower, upper = -upper, -lower
+        self.database.update(node.key, lower, upper)
+
+    def count(self, node: PNSNode):
+        return 1 + sum(self.count(child) for child in node.children or ())
+
+
+class ProofNumberSearchPlayer(Player):
+    """Player that solves positions with proof-number search, backed by a persistent database."""
+
+    def __init__(self, max_nodes=100000, db_path=":memory:", fallback: Player = None):
+        """
+        Parameters:
+            max_nodes: the maximum number of nodes kept in the search tree.
+            db_path: the SQLite file of solved positions, shared by all searches.
+            fallback: the player asked for a move when the position can not be solved
+                within max_nodes; the first action is played if it is None.
+        """
+        super().__init__()
+        self.max_nodes = max_nodes
+        self.db_path = db_path
+        self.fallback = fallback
+        self.database = None
+        self.value = None  # the value of the last position searched, None if unsolved
+
+    def set_player(self, p):
+        super().set_player(p)
+        if self.fallback is not None:
+            self.fallback.set_player(p)
+
+    def solve(self, state: State):
+        """
+        Return Tuple(value, move): the value of state for its player to move (1, 0, -1 or None
+        if unsolved) and a move achieving it (None if there is none to prefer).
+        """
+        if self.database is None:
+            # opened lazily, so players can be built in one process and used in another
+            self.database = SolvedDatabase(self.db_path)
+        search = ProofNumberSearch(self.database, self.max_nodes)
+        for threshold in (1, 0):
+            result, root = search.prove(state, threshold)
+            if result is None:
+                return None, None
+            if result:
+                if root.children is None:
+                    # solved at the root: the winning move, or else the database, tells the move
+                    moves = state.get_winning_moves(state.get_current_player())
+                    if moves:
+                        return threshold, moves[0]
+                    search.expand(root, state)
+                return threshold, next((child.move for child in root.children if child.pn == 0), None)
+        return -1, None
+
+    def get_action(self, state: State):
+        self.value, move = self.solve(state)
+        if move is not None:
+            return move
+        if self.fallback is not None:
+            return self.fallback.get_action(state)
+        return state.get_all_actions()[0]
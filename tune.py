@@ -0,0 +1,178 @@
+"""
+Texel-style tuning of the weights of detailed_evaluation_func on a position dataset.
+
+Every position of the finished games of a record file (see record.py) is labeled with the result
+of its game for the player to move (1 for a win, 0.5 for a tie, 0 for a loss) and turned into a
+feature vector: the Board.get_info counts of evaluation.FACTORS for the player to move, followed
+by the negated counts for the opponent, so that the score of weighted_evaluation_func is the dot
+product of the features and the weights (before clipping). The features are extracted once, in a
+pool of worker processes, and cached to a compressed .npz file.
+
+The weights are then fitted by logistic regression of the results on K * score / SCORE_SCALE over
+the whole feature matrix (Newton's method, L2-regularized towards the starting weights, so factors
+that never occur keep their weight). The scale K is fitted first for the starting weights, so the
+tuned weights keep their scale and are written in the same format, to be loaded with
+--evaluation_func weights.json in play.py.
+"""
+from __future__ import print_function
+
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from evaluation import FACTORS, SCORE_SCALE, WEIGHTS_PLAYER, WEIGHTS_OPPONENT, WeightedEvaluationFunc
+from record import read_records
+
+
+def get_features(state):
+    """Return the feature vector of a Board for the player to move."""
+    player = state.get_current_player()
+    info = state.get_info()
+    features = np.zeros(2 * len(FACTORS))
+    for p, info_p in info.items():
+        if p == player:
+            features[:len(FACTORS)] = [info_p[factor] for factor in FACTORS]
+        else:
+            features[len(FACTORS):] = [-info_p[factor] for factor in FACTORS]
+    return features
+
+
+def _extract_game(job):
+    record, min_ply = job
+    board = record.new_board()
+    features, players = [], []
+    for ply, move in enumerate(record.moves):
+        if ply >= min_ply:
+            features.append(get_features(board))
+            players.append(board.get_current_player())
+        board.perform_action(move)
+    if not board.game_end()[0] or not features:
+        return np.zeros((0, 2 * len(FACTORS)), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    players = np.array(players)
+    results = 0.5 if record.winner == -1 else (players == record.winner).astype(np.float32)
+    return np.array(features, dtype=np.float32), np.broadcast_to(results, players.shape).astype(np.float32)
+
+
+def extract_features(path, n_workers=None, min_ply=0):
+    """
+    Return Tuple(features, results) of every position of the finished games of a record file,
+    from ply min_ply on, extracted in a pool of n_workers processes (all cores if None).
+    """
+    jobs = ((record, min_ply) for record in read_records(path))
+    with Pool(n_workers) as pool:
+        games = list(pool.imap(_extract_game, jobs, chunksize=8))
+    if not games:
+        return np.zeros((0, 2 * len(FACTORS)), dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate([f for f, _ in games]), np.concatenate([r for _, r in games])
+
+
+def load_features(path, cache_path, n_workers=None, min_ply=0):
+    """Like extract_features, but reuse cache_path if it is newer than the records and has the same min_ply."""
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        with np.load(cache_path) as data:
+            if int(data["min_ply"]) == min_ply:
+                return data["features"], data["results"]
+    features, results = extract_features(path, n_workers, min_ply)
+    with open(cache_path, "wb") as f:
+        np.savez_compressed(f, features=features, results=results, min_ply=min_ply)
+    return features, results
+
+
+def get_weight_vector(weights_player, weights_opponent):
+    return np.array([weights_player[factor] for factor in FACTORS]
+                    + [weights_opponent[factor] for factor in FACTORS], dtype=np.float64)
+
+
+def get_weight_dicts(weights):
+    """Return Tuple(weights_player, weights_opponent) of a weight vector, in the format of evaluation.py."""
+    weights = [int(round(w)) for w in weights]
+    return dict(zip(FACTORS, weights[:len(FACTORS)])), dict(zip(FACTORS, weights[len(FACTORS):]))
+
+
+def log_loss(logits, results):
+    """The mean cross entropy of results and sigmoid(logits)."""
+    return float(np.mean(np.logaddexp(0, logits) - results * logits))
+
+
+def fit_scale(features, results, weights):
+    """Return the scale K minimizing the loss of sigmoid(K * score / SCORE_SCALE) for the given weights."""
+    scores = features @ weights / SCORE_SCALE
+    scales = np.logspace(-3, 2, 101)
+    losses = [log_loss(k * scores, results) for k in scales]
+    return float(scales[int(np.argmin(losses))])
+
+
+def fit_weights(features, results, weights, scale, l2=1e-3, n_iter=50):
+    """
+    Fit the weights of the logistic model sigmoid(scale * features @ weights / SCORE_SCALE) by
+    Newton's method, with an L2 penalty on the distance to the starting weights (in units of
+    the standard deviations of the features).
+    """
+    std = features.std(axis=0).astype(np.float64)
+    std[std == 0] = 1
+    x = features / std
+    start = weights * std * scale / SCORE_SCALE
+    beta = start.copy()
+
+    def loss(b):
+        return log_loss(x @ b, results) + l2 / 2 * np.sum((b - start) ** 2)
+
+    current = loss(beta)
+    for _ in range(n_iter):
+        p = 1 / (1 + np.exp(-(x @ beta)))
+        grad = x.T @ (p - results) / len(x) + l2 * (beta - start)
+        hess = (x.T * (p * (1 - p))) @ x / len(x) + l2 * np.eye(len(beta))
+        step = np.linalg.solve(hess, grad)
+        # halve the step until the loss decreases, as plain Newton steps may overshoot
+        for _ in range(30):
+            new = loss(beta - step)
+            if new <= current:
+                break
+            step = step / 2
+        beta, current, size = beta - step, new, np.max(np.abs(step))
+        if size < 1e-8:
+            break
+    return beta / std * SCORE_SCALE / scale
+
+
+def tune(args):
+    cache_path = args.cache or args.records + ".features.npz"
+    start_time = time.time()
+    features, results = load_features(args.records, cache_path, args.n_workers, args.min_ply)
+    print(f"{len(features)} positions loaded in {time.time() - start_time:.1f}s")
+    if not len(features):
+        return None
+
+    start_time = time.time()
+    weights = get_weight_vector(WEIGHTS_PLAYER, WEIGHTS_OPPONENT)
+    scale = fit_scale(features, results, weights)
+    loss = log_loss(scale * features @ weights / SCORE_SCALE, results)
+    tuned = fit_weights(features, results, weights, scale, args.l2, args.n_iter)
+    tuned_loss = log_loss(scale * features @ tuned / SCORE_SCALE, results)
+    print(f"K = {scale:.4g}, loss {loss:.5f} -> {tuned_loss:.5f} in {time.time() - start_time:.1f}s")
+
+    weights_player, weights_opponent = get_weight_dicts(tuned)
+    print("weights_player =", weights_player)
+    print("weights_opponent =", weights_opponent)
+    evaluation_func = WeightedEvaluationFunc(weights_player, weights_opponent)
+    evaluation_func.save(args.output)
+    return evaluation_func
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("records", type=str, help="Game record file (see record.py).")
+    parser.add_argument("--output", type=str, default="weights.json", help="Output file of the tuned weights.")
+    parser.add_argument("--cache", type=str, default=None,
+                        help="Feature cache (.npz), next to the records if not given.")
+    parser.add_argument("--min_ply", type=int, default=4, help="Skip the positions before this ply.")
+    parser.add_argument("--l2", type=float, default=1e-3, help="L2 penalty on the change of the weights.")
+    parser.add_argument("--n_iter", type=int, default=50, help="Maximum number of Newton iterations.")
+    parser.add_argument("--n_workers", type=int, default=None, help="Number of worker processes (default: all cores).")
+    args = parser.parse_args()
+
+    tune(args)